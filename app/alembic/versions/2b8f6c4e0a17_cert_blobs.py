@@ -0,0 +1,58 @@
+"""cert-blobs
+
+Revision ID: 2b8f6c4e0a17
+Revises: 7e1b3d5a9c64
+Create Date: 2026-10-18 19:12:40.337915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b8f6c4e0a17'
+down_revision: Union[str, Sequence[str], None] = '7e1b3d5a9c64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('cert_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.add_column('certs', sa.Column('blob_sha256', sa.String(length=64), nullable=True))
+    op.create_foreign_key('certs_blob_sha256_fkey', 'certs', 'cert_blobs', ['blob_sha256'], ['sha256'])
+
+    # Пустые файлы (прежняя загрузка читала уже прочитанный поток) не переносим
+    op.execute("""
+        INSERT INTO cert_blobs (sha256, data, size, created_at)
+        SELECT DISTINCT ON (sha256(certificate)) encode(sha256(certificate), 'hex'), certificate, length(certificate), now()
+        FROM certs
+        WHERE length(certificate) > 0
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        UPDATE certs SET blob_sha256 = encode(sha256(certificate), 'hex')
+        WHERE length(certificate) > 0
+    """)
+    op.drop_column('certs', 'certificate')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('certs', sa.Column('certificate', sa.LargeBinary(), nullable=True))
+    op.execute("""
+        UPDATE certs c SET certificate = b.data
+        FROM cert_blobs b
+        WHERE b.sha256 = c.blob_sha256
+    """)
+    op.drop_constraint('certs_blob_sha256_fkey', 'certs', type_='foreignkey')
+    op.drop_column('certs', 'blob_sha256')
+    op.drop_table('cert_blobs')
@@ -0,0 +1,69 @@
+"""lookup-indexes
+
+Revision ID: 3f1a9c2d7b84
+Revises: 1172d94d6460
+Create Date: 2026-10-18 10:12:41.503217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2d7b84'
+down_revision: Union[str, Sequence[str], None] = '1172d94d6460'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Перед уникальными индексами сливаем дубликаты, накопленные гонками загрузок.
+    # Остается запись с минимальным id, связи переносятся на нее.
+    op.execute("""
+        INSERT INTO cert_pc (pc_id, cert_id)
+        SELECT cp.pc_id, d.keep_id
+        FROM cert_pc cp
+        JOIN (SELECT cert_id, min(cert_id) OVER (PARTITION BY thumbprint) AS keep_id
+              FROM certs WHERE thumbprint IS NOT NULL) d ON d.cert_id = cp.cert_id
+        WHERE d.cert_id <> d.keep_id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("DELETE FROM certs c USING certs k WHERE c.thumbprint = k.thumbprint AND c.cert_id > k.cert_id")
+
+    op.execute("""
+        UPDATE certs SET person_id = d.keep_id
+        FROM (SELECT person_id, min(person_id) OVER (PARTITION BY name) AS keep_id
+              FROM persons WHERE name IS NOT NULL) d
+        WHERE certs.person_id = d.person_id AND d.person_id <> d.keep_id
+    """)
+    op.execute("DELETE FROM persons p USING persons k WHERE p.name = k.name AND p.person_id > k.person_id")
+
+    for table, column in (("cert_pc", "cert_id"), ("service_pc", "service_id")):
+        op.execute(f"""
+            INSERT INTO {table} (pc_id, {column})
+            SELECT d.keep_id, t.{column}
+            FROM {table} t
+            JOIN (SELECT pc_id, min(pc_id) OVER (PARTITION BY domain_name) AS keep_id
+                  FROM pcs WHERE domain_name IS NOT NULL) d ON d.pc_id = t.pc_id
+            WHERE d.pc_id <> d.keep_id
+            ON CONFLICT DO NOTHING
+        """)
+    op.execute("DELETE FROM pcs p USING pcs k WHERE p.domain_name = k.domain_name AND p.pc_id > k.pc_id")
+
+    op.execute("DELETE FROM telegram_users t USING telegram_users k WHERE t.chat_id = k.chat_id AND t.id > k.id")
+
+    op.create_index(op.f('ix_certs_thumbprint'), 'certs', ['thumbprint'], unique=True)
+    op.create_index(op.f('ix_persons_name'), 'persons', ['name'], unique=True)
+    op.create_index(op.f('ix_pcs_domain_name'), 'pcs', ['domain_name'], unique=True)
+    op.create_index(op.f('ix_telegram_users_chat_id'), 'telegram_users', ['chat_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_telegram_users_chat_id'), table_name='telegram_users')
+    op.drop_index(op.f('ix_pcs_domain_name'), table_name='pcs')
+    op.drop_index(op.f('ix_persons_name'), table_name='persons')
+    op.drop_index(op.f('ix_certs_thumbprint'), table_name='certs')
@@ -0,0 +1,30 @@
+"""email-url-sort-indexes
+
+Revision ID: 4e7a1c9b3d52
+Revises: 9c4f2a7d1e85
+Create Date: 2026-10-18 21:40:27.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7a1c9b3d52'
+down_revision: Union[str, Sequence[str], None] = '9c4f2a7d1e85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_persons_email_person_id', 'persons', ['email', 'person_id'], unique=False)
+    op.create_index('ix_services_url_service_id', 'services', ['url', 'service_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_services_url_service_id', table_name='services')
+    op.drop_index('ix_persons_email_person_id', table_name='persons')
@@ -0,0 +1,37 @@
+"""telegram-poll-state
+
+Revision ID: 5c9e7a3b2f18
+Revises: e4a8c2f61d09
+Create Date: 2026-10-18 16:02:44.905127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c9e7a3b2f18'
+down_revision: Union[str, Sequence[str], None] = 'e4a8c2f61d09'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('telegram_poll_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('last_update_id', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # id групповых чатов (-100...) не помещаются в integer
+    op.alter_column('telegram_users', 'chat_id', existing_type=sa.Integer(), type_=sa.BigInteger(),
+                    existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('telegram_users', 'chat_id', existing_type=sa.BigInteger(), type_=sa.Integer(),
+                    existing_nullable=False)
+    op.drop_table('telegram_poll_state')
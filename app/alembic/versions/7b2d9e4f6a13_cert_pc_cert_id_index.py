@@ -0,0 +1,28 @@
+"""cert-pc-cert-id-index
+
+Revision ID: 7b2d9e4f6a13
+Revises: 4e7a1c9b3d52
+Create Date: 2026-10-19 10:12:48.316204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2d9e4f6a13'
+down_revision: Union[str, Sequence[str], None] = '4e7a1c9b3d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_cert_pc_cert_id', 'cert_pc', ['cert_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cert_pc_cert_id', table_name='cert_pc')
@@ -0,0 +1,38 @@
+"""timestamptz
+
+Revision ID: 7e1b3d5a9c64
+Revises: f3c7a9e2b415
+Create Date: 2026-10-18 18:34:51.802716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e1b3d5a9c64'
+down_revision: Union[str, Sequence[str], None] = 'f3c7a9e2b415'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Старые значения записаны как локальное время сервера приложения -
+    # Postgres трактует их в часовом поясе сессии (TimeZone)
+    op.alter_column('pcs', 'timestamp', existing_type=sa.DateTime(), type_=sa.DateTime(timezone=True),
+                    existing_nullable=True)
+    op.alter_column('pc_spec_changes', 'timestamp', existing_type=sa.DateTime(), type_=sa.DateTime(timezone=True),
+                    existing_nullable=False)
+    op.create_index('ix_pcs_timestamp_pc_id', 'pcs', ['timestamp', 'pc_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pcs_timestamp_pc_id', table_name='pcs')
+    op.alter_column('pc_spec_changes', 'timestamp', existing_type=sa.DateTime(timezone=True), type_=sa.DateTime(),
+                    existing_nullable=False)
+    op.alter_column('pcs', 'timestamp', existing_type=sa.DateTime(timezone=True), type_=sa.DateTime(),
+                    existing_nullable=True)
@@ -0,0 +1,38 @@
+"""list-sort-indexes
+
+Revision ID: 8d2e4b6a1c37
+Revises: 3f1a9c2d7b84
+Create Date: 2026-10-18 12:40:08.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b6a1c37'
+down_revision: Union[str, Sequence[str], None] = '3f1a9c2d7b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_certs_date_to_cert_id', 'certs', ['date_to', 'cert_id'], unique=False)
+    op.create_index('ix_certs_name_cert_id', 'certs', ['name', 'cert_id'], unique=False)
+    op.create_index('ix_certs_org_cert_id', 'certs', ['org', 'cert_id'], unique=False)
+    op.create_index('ix_pcs_name_pc_id', 'pcs', ['name', 'pc_id'], unique=False)
+    op.create_index('ix_pcs_aud_pc_id', 'pcs', ['aud', 'pc_id'], unique=False)
+    op.create_index('ix_services_name_service_id', 'services', ['name', 'service_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_services_name_service_id', table_name='services')
+    op.drop_index('ix_pcs_aud_pc_id', table_name='pcs')
+    op.drop_index('ix_pcs_name_pc_id', table_name='pcs')
+    op.drop_index('ix_certs_org_cert_id', table_name='certs')
+    op.drop_index('ix_certs_name_cert_id', table_name='certs')
+    op.drop_index('ix_certs_date_to_cert_id', table_name='certs')
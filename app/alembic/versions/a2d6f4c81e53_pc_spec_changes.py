@@ -0,0 +1,76 @@
+"""pc-spec-changes
+
+Revision ID: a2d6f4c81e53
+Revises: 5c9e7a3b2f18
+Create Date: 2026-10-18 16:47:19.264830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2d6f4c81e53'
+down_revision: Union[str, Sequence[str], None] = '5c9e7a3b2f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pc_spec_changes',
+    sa.Column('change_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('pc_id', sa.Integer(), nullable=False),
+    sa.Column('component', sa.String(length=32), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('old', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('new', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.ForeignKeyConstraint(['pc_id'], ['pcs.pc_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('change_id')
+    )
+    op.create_index('ix_pc_spec_changes_pc_id_timestamp', 'pc_spec_changes', ['pc_id', 'timestamp', 'change_id'], unique=False)
+
+    # Старые записи spec_history ({"date", "old", "new"}) не хранят компонент -
+    # восстанавливаем его по ключам, которые присылает hlam/script.ps1
+    op.execute("""
+        INSERT INTO pc_spec_changes (pc_id, component, timestamp, old, new)
+        SELECT p.pc_id,
+               CASE
+                   WHEN jsonb_typeof(coalesce(h.item->'new', h.item->'old')) = 'array' THEN 'storage'
+                   WHEN coalesce(h.item->'new', h.item->'old') ? 'totalGB' THEN 'ram'
+                   WHEN coalesce(h.item->'new', h.item->'old') ? 'cores' THEN 'cpu'
+                   WHEN coalesce(h.item->'new', h.item->'old') ? 'ramMB' THEN 'gpu'
+                   WHEN coalesce(h.item->'new', h.item->'old') ? 'product' THEN 'motherboard'
+                   ELSE 'unknown'
+               END,
+               to_timestamp(h.item->>'date', 'DD-MM-YYYY HH24:MI:SS')::timestamp,
+               h.item->'old',
+               h.item->'new'
+        FROM pcs p
+        CROSS JOIN LATERAL unnest(p.spec_history) WITH ORDINALITY AS h(item, n)
+        WHERE p.spec_history IS NOT NULL
+        ORDER BY p.pc_id, h.n
+    """)
+    op.drop_column('pcs', 'spec_history')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('pcs', sa.Column('spec_history', postgresql.ARRAY(postgresql.JSONB(astext_type=sa.Text())), nullable=True))
+    op.execute("""
+        UPDATE pcs p SET spec_history = h.items
+        FROM (
+            SELECT pc_id,
+                   array_agg(jsonb_build_object('date', to_char(timestamp, 'DD-MM-YYYY HH24:MI:SS'),
+                                                'old', old, 'new', new)
+                             ORDER BY timestamp, change_id) AS items
+            FROM pc_spec_changes
+            GROUP BY pc_id
+        ) h
+        WHERE h.pc_id = p.pc_id
+    """)
+    op.drop_index('ix_pc_spec_changes_pc_id_timestamp', table_name='pc_spec_changes')
+    op.drop_table('pc_spec_changes')
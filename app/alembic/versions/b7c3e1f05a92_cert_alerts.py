@@ -0,0 +1,36 @@
+"""cert-alerts
+
+Revision ID: b7c3e1f05a92
+Revises: 8d2e4b6a1c37
+Create Date: 2026-10-18 14:05:52.630914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c3e1f05a92'
+down_revision: Union[str, Sequence[str], None] = '8d2e4b6a1c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('cert_alerts',
+    sa.Column('alert_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('cert_id', sa.Integer(), nullable=False),
+    sa.Column('window_days', sa.Integer(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['cert_id'], ['certs.cert_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('alert_id'),
+    sa.UniqueConstraint('cert_id', 'window_days')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('cert_alerts')
@@ -0,0 +1,29 @@
+"""pc-spec-hash
+
+Revision ID: d81b5e9f3c26
+Revises: a2d6f4c81e53
+Create Date: 2026-10-18 17:20:36.117402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81b5e9f3c26'
+down_revision: Union[str, Sequence[str], None] = 'a2d6f4c81e53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Заполняется при следующем отчете агента: хэш считается в Python (spec_check.spec_hash)
+    op.add_column('pcs', sa.Column('spec_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pcs', 'spec_hash')
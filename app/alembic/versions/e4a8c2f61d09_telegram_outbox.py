@@ -0,0 +1,41 @@
+"""telegram-outbox
+
+Revision ID: e4a8c2f61d09
+Revises: b7c3e1f05a92
+Create Date: 2026-10-18 15:21:07.418352
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a8c2f61d09'
+down_revision: Union[str, Sequence[str], None] = 'b7c3e1f05a92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('telegram_outbox',
+    sa.Column('outbox_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('chat_id', sa.BigInteger(), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(length=255), nullable=True),
+    sa.Column('failed', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('outbox_id')
+    )
+    op.create_index('ix_telegram_outbox_due', 'telegram_outbox', ['next_attempt_at'], unique=False,
+                    postgresql_where=sa.text('NOT failed'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_telegram_outbox_due', table_name='telegram_outbox', postgresql_where=sa.text('NOT failed'))
+    op.drop_table('telegram_outbox')
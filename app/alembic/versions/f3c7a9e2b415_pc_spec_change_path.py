@@ -0,0 +1,31 @@
+"""pc-spec-change-path
+
+Revision ID: f3c7a9e2b415
+Revises: d81b5e9f3c26
+Create Date: 2026-10-18 17:58:03.551290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c7a9e2b415'
+down_revision: Union[str, Sequence[str], None] = 'd81b5e9f3c26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pc_spec_changes', sa.Column('path', sa.String(), nullable=True))
+    # Прежние записи хранили компонент целиком - это изменение по пути самого компонента
+    op.execute("UPDATE pc_spec_changes SET path = component")
+    op.alter_column('pc_spec_changes', 'path', existing_type=sa.String(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pc_spec_changes', 'path')
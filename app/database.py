@@ -1,17 +1,122 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from app.config import get_settings
 
 settings = get_settings()
 
 
+def async_database_url(url: str):
+    """DATABASE_URL общий с alembic (psycopg2), приложению нужен драйвер asyncpg"""
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+
 # Подключение к БД
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+)
+SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+class PoolMetrics:
+    """Статистика пула соединений: выдачи, возвраты и ожидание свободного соединения"""
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def on_checkout(self, *args):
+        self.checkouts += 1
+
+    def on_checkin(self, *args):
+        self.checkins += 1
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def stats(self) -> dict:
+        pool = engine.pool
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "wait_avg_ms": self.wait_total / self.waits * 1000 if self.waits else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+
+pool_metrics = PoolMetrics()
+event.listen(engine.sync_engine, "checkout", pool_metrics.on_checkout)
+event.listen(engine.sync_engine, "checkin", pool_metrics.on_checkin)
+
 
-def get_db():
-    db = SessionLocal()
+async def get_request_db(request: Request) -> AsyncSession:
+    """
+    Одна сессия на запрос, создается при первом обращении
+
+    Сессия хранится в request.state, поэтому AuthMiddleware и обработчик
+    маршрута работают с одним и тем же соединением.
+    """
+    db = getattr(request.state, "db", None)
+    if db is None:
+        db = SessionLocal()
+        start = time.perf_counter()
+        await db.connection()
+        pool_metrics.record_wait(time.perf_counter() - start)
+        request.state.db = db
+    return db
+
+
+async def close_request_db(request: Request):
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        request.state.db = None
+        await db.close()
+
+
+async def get_db(request: Request):
+    # Закрывает сессию тот, кто ее создал: middleware или эта зависимость
+    owner = getattr(request.state, "db", None) is None
+    db = await get_request_db(request)
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        if owner:
+            await close_request_db(request)
+
+
+class QueryCounter:
+    """Счетчик обращений к БД (запросы + commit) в рамках одной сессии"""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+@asynccontextmanager
+async def count_queries(db: AsyncSession):
+    counter = QueryCounter()
+    conn = (await db.connection()).sync_connection
+    event.listen(conn, "before_cursor_execute", counter)
+    event.listen(conn, "commit", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(conn, "before_cursor_execute", counter)
+        event.remove(conn, "commit", counter)
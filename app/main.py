@@ -1,26 +1,57 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
 from app.middleware.auth import AuthMiddleware
-from app.routers import persons, login, certs, pcs, services, pc_parcer, monitor_pc, telegram_alert
+from app.routers import persons, login, certs, pcs, services, pc_parcer, monitor_pc, telegram_alert, metrics
+
+from sqlalchemy import func, select
 
 from app.database import engine
 from app.models import models
 
-import app.utils.cert_info
+from app.utils import cert_info, expiry_alerts, ingest_queue, leader, tg_bot_alert, tg_outbox, tg_updates
+from app.middleware import hash_tokens, token_cache
 
 from app.config import get_settings
 
 
 settings = get_settings()
 
-# 1. Создаем таблицы в БД
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 1. Создаем таблицы в БД
+    async with engine.begin() as conn:
+        # Воркеры стартуют одновременно: CREATE TABLE по очереди, иначе гонка в pg_type
+        await conn.execute(select(func.pg_advisory_xact_lock(leader.LOCK_KEY + 1)))
+        await conn.run_sync(models.Base.metadata.create_all)
+    if settings.INGEST_QUEUE_ENABLED:
+        ingest_queue.queue.start()
+    token_cache.revocation_sync.start()
+    # Отправка, getUpdates и проверка сроков - только в одном воркере:
+    # лимиты Bot API считает RateLimiter одного процесса
+    leader.leader.add(tg_outbox.worker)
+    if settings.TG_POLL_ENABLED:
+        leader.leader.add(tg_updates.poller)
+    if settings.EXPIRY_SCAN_ENABLED:
+        leader.leader.add(expiry_alerts.scheduler)
+    leader.leader.start()
+    yield
+    # Очередь отчетов дописывается в БД, пока пул соединений еще открыт
+    await ingest_queue.queue.stop()
+    await leader.leader.stop()
+    await token_cache.revocation_sync.stop()
+    await tg_bot_alert.bot.close()
+    cert_info.pool.shutdown()
+    hash_tokens.shutdown_executor()
+    await engine.dispose()
+
 
 # 2. Создаем приложение
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 3. Настраиваем шаблоны
 templates = Jinja2Templates(directory="./app/templates")
@@ -37,6 +68,7 @@ app.include_router(services.router)
 app.include_router(pc_parcer.router)
 app.include_router(monitor_pc.router)
 app.include_router(telegram_alert.router)
+app.include_router(metrics.router)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -1,76 +1,112 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import RedirectResponse
+import re
 
-from app.database import SessionLocal
+from starlette.requests import Request
+from starlette.responses import RedirectResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from sqlalchemy import select
+
+from app.database import get_request_db, close_request_db
 from app.models.models import User
 
 from app.middleware.hash_tokens import create_access_token, create_refresh_token
-from jose import JWTError, jwt
+from app.middleware.token_cache import is_revoked_clause, token_cache
+from jose import JWTError
 
 from app.config import get_settings
 
 settings = get_settings()
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+# Пути, доступные без проверки токенов
+PUBLIC_PATHS = re.compile(r"/auth/login\Z|/static/|/parcer/")
+
+
+def cookie_headers(response: Response) -> list[tuple[bytes, bytes]]:
+    return [(name, value) for name, value in response.raw_headers if name == b"set-cookie"]
+
+
+def send_with_headers(send: Send, headers: list[tuple[bytes, bytes]]) -> Send:
+    """Добавляет заголовки (Set-Cookie) к ответу приложения, не буферизуя тело"""
+    async def wrapped(message: Message):
+        if message["type"] == "http.response.start":
+            message["headers"] = list(message.get("headers", [])) + headers
+        await send(message)
+    return wrapped
+
+
+class AuthMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         #пропускаем всех по этим путям без проверки
-        if request.url.path in ["/auth/login"] or request.url.path.startswith(("/static/", '/parcer/')):
-            return await call_next(request)
+        if scope["type"] != "http" or PUBLIC_PATHS.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
 
+        request = Request(scope)
+        try:
+            await self.authenticate(request, scope, receive, send)
+        finally:
+            # Сессия, открытая на пути обновления токена, живет до конца запроса
+            await close_request_db(request)
+
+    async def authenticate(self, request: Request, scope: Scope, receive: Receive, send: Send):
         access_token = request.cookies.get(settings.COOKIE_NAME)
-        refresh_token = request.cookies.get("refresh_token")
-        db = SessionLocal()
+        refresh_token = request.cookies.get(settings.REFRESH_COOKIE_NAME)
         # Пробуем проверить access token
         if access_token:
             try:
-                jwt.decode(access_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-                # Токен валидный - просто идем дальше
-                return await call_next(request)
+                token_cache.decode(access_token)
             except JWTError:
                 # Токен протух или битый - пробуем обновить
                 pass
+            else:
+                # Токен валидный - просто идем дальше
+                await self.app(scope, receive, send)
+                return
         # Если есть refresh token - обновляем прямо здесь!
         if refresh_token:
             try:
                 # Проверяем refresh token
-                refresh_payload = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-                username = refresh_payload.get("sub")
-                if username and db.query(User).filter(User.login == username).first():
-                    # Создаем новые токены
-                    new_access = create_access_token({"sub": username})
-                    new_refresh = create_refresh_token({"sub": username})
-                    # Выполняем запрос
-                    response = await call_next(request)
-
-                    # Обновляем куки
-                    response.set_cookie(
-                        key="access_token",
-                        value=new_access,
-                        httponly=True,
-                        secure=True,
-                        max_age=settings.ACCESS_TOKEN_EXPIRE_SECONDS,
-                        path="/"
-                    )
-                    response.set_cookie(
-                        key="refresh_token",
-                        value=new_refresh,
-                        httponly=True,
-                        secure=True,
-                        max_age=settings.REFRESH_TOKEN_EXPIRE_SECONDS,
-                        path="/"
-                    )
-
-                    print(f"? Токен обновлен для {username}")
-                    return response
-
+                refresh_payload = token_cache.decode(refresh_token)
             except JWTError:
-                # Refresh протух - чистим куки
+                # Refresh протух, отозван или битый - чистим куки и на страницу входа
                 print("? Refresh token протух")
-                response = await call_next(request)
-                response.delete_cookie("access_token", path="/")
-                response.delete_cookie("refresh_token", path="/")
-                return response
-        # Нет токенов - просто выполняем (будет 401)
+                response = RedirectResponse(url="/auth/login", status_code=303)
+                response.delete_cookie(settings.COOKIE_NAME, path="/")
+                response.delete_cookie(settings.REFRESH_COOKIE_NAME, path="/")
+                await response(scope, receive, send)
+                return
+
+            username = refresh_payload.get("sub")
+            db = await get_request_db(request)
+            # Отзыв в другом воркере мог еще не дойти до token_cache - проверяем по БД
+            if username and await db.scalar(
+                select(User.user_id).where(User.login == username, ~is_revoked_clause(refresh_token))
+            ) is not None:
+                # Создаем новые токены и обновляем куки
+                cookies = Response()
+                cookies.set_cookie(
+                    key=settings.COOKIE_NAME,
+                    value=create_access_token({"sub": username}),
+                    httponly=True,
+                    secure=True,
+                    max_age=settings.ACCESS_TOKEN_EXPIRE_SECONDS,
+                    path="/"
+                )
+                cookies.set_cookie(
+                    key=settings.REFRESH_COOKIE_NAME,
+                    value=create_refresh_token({"sub": username}),
+                    httponly=True,
+                    secure=True,
+                    max_age=settings.REFRESH_TOKEN_EXPIRE_SECONDS,
+                    path="/"
+                )
+                # Выполняем запрос
+                await self.app(scope, receive, send_with_headers(send, cookie_headers(cookies)))
+                print(f"? Токен обновлен для {username}")
+                return
+        # Нет токенов - на страницу входа
         print("?? Нет токенов")
-        return RedirectResponse(url="/auth/login", status_code=303)
+        await RedirectResponse(url="/auth/login", status_code=303)(scope, receive, send)
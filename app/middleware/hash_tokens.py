@@ -1,6 +1,12 @@
 from jose import JWTError, jwt
 
+from app.middleware.token_cache import token_cache
+
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import secrets
+import time
 
 import bcrypt
 
@@ -10,7 +16,7 @@ settings = get_settings()
 
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode("utf-8")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -20,10 +26,90 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
             )
 
 
+def needs_rehash(hashed_password: str) -> bool:
+    """Хэш посчитан с другим cost, чем BCRYPT_ROUNDS ($2b$<cost>$...)"""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+class HashPoolBusy(Exception):
+    """Очередь bcrypt переполнена - клиенту стоит повторить позже"""
+
+
+class HashMetrics:
+    """Время вызовов bcrypt: выполнение в пуле и ожидание в очереди"""
+    def __init__(self):
+        self.calls = {"hash": 0, "verify": 0}
+        self.rejected = {"hash": 0, "verify": 0}
+        self.run_total = {"hash": 0.0, "verify": 0.0}
+        self.run_max = {"hash": 0.0, "verify": 0.0}
+        self.wait_total = {"hash": 0.0, "verify": 0.0}
+
+    def record(self, op: str, run: float, wait: float):
+        self.calls[op] += 1
+        self.run_total[op] += run
+        self.run_max[op] = max(self.run_max[op], run)
+        self.wait_total[op] += wait
+
+    def stats(self) -> dict:
+        return {
+            op: {
+                "calls": calls,
+                "rejected": self.rejected[op],
+                "run_avg_ms": self.run_total[op] / calls * 1000 if calls else 0.0,
+                "run_max_ms": self.run_max[op] * 1000,
+                "wait_avg_ms": self.wait_total[op] / calls * 1000 if calls else 0.0,
+                "rounds": settings.BCRYPT_ROUNDS,
+            }
+            for op, calls in self.calls.items()
+        }
+
+
+hash_metrics = HashMetrics()
+# bcrypt отпускает GIL, поэтому потоков достаточно; очередь ограничена семафором
+_executor = ThreadPoolExecutor(max_workers=settings.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_slots = asyncio.Semaphore(settings.BCRYPT_WORKERS + settings.BCRYPT_QUEUE_SIZE)
+
+
+async def _run_bcrypt(op: str, func, *args):
+    queued = time.perf_counter()
+    try:
+        await asyncio.wait_for(_slots.acquire(), settings.BCRYPT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        hash_metrics.rejected[op] += 1
+        raise HashPoolBusy()
+    try:
+        def timed():
+            start = time.perf_counter()
+            result = func(*args)
+            return result, start, time.perf_counter()
+
+        result, start, end = await asyncio.get_running_loop().run_in_executor(_executor, timed)
+    finally:
+        _slots.release()
+    hash_metrics.record(op, run=end - start, wait=start - queued)
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_bcrypt("hash", get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_bcrypt("verify", verify_password, plain_password, hashed_password)
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(seconds=settings.ACCESS_TOKEN_EXPIRE_SECONDS)
-    to_encode.update({"exp": expire, "type": "access"})
+    # jti делает токен уникальным: отзыв одного не задевает выданный в ту же секунду
+    to_encode.update({"exp": expire, "type": "access", "jti": secrets.token_hex(8)})
     encode_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encode_jwt
 
@@ -31,14 +117,13 @@ def create_access_token(data: dict):
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(seconds=settings.REFRESH_TOKEN_EXPIRE_SECONDS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode.update({"exp": expire, "type": "refresh", "jti": secrets.token_hex(8)})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
 # Функция для проверки токена
 def decode_token(token: str):
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        return token_cache.decode(token)
     except JWTError:
         return None  # Если токен недействителен или истёк
\ No newline at end of file
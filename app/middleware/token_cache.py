@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from jose import JWTError, jwt
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.models import RevokedToken
+
+settings = get_settings()
+
+
+class TokenCache:
+    """
+    Кэш уже проверенных JWT и список отозванных токенов
+
+    Токен хранится по SHA-256 и живет в кэше не дольше своего exp, поэтому
+    повторные запросы с той же cookie не проверяют подпись заново. Отозванный
+    токен (logout, смена пароля) отклоняется до истечения его exp. Сам список
+    отозванных - в памяти процесса; другие воркеры узнают о них из таблицы
+    revoked_tokens через RevocationSync.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._verified: "OrderedDict[bytes, tuple[dict, float]]" = OrderedDict()
+        self._revoked: dict[bytes, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def decode(self, token: str) -> dict:
+        key = self.key(token)
+        now = time.time()
+        if key in self._revoked:
+            raise JWTError("Token revoked")
+
+        entry = self._verified.get(key)
+        if entry is not None and entry[1] > now:
+            self._verified.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        exp = payload.get("exp")
+        if exp is not None and self.maxsize > 0:
+            self._verified[key] = (payload, float(exp))
+            self._verified.move_to_end(key)
+            while len(self._verified) > self.maxsize:
+                self._verified.popitem(last=False)
+        return payload
+
+    def revoke(self, token: str) -> tuple[bytes, float]:
+        """Отозвать в этом процессе; возвращает (ключ, exp) для записи в revoked_tokens"""
+        key = self.key(token)
+        try:
+            exp = float(jwt.get_unverified_claims(token).get("exp"))
+        except (JWTError, TypeError, ValueError):
+            exp = time.time() + settings.REFRESH_TOKEN_EXPIRE_SECONDS
+        self.revoke_key(key, exp)
+        return key, exp
+
+    def revoke_key(self, key: bytes, exp: float):
+        self._verified.pop(key, None)
+        self._revoked[key] = exp
+
+        # Токены с истекшим exp отклонит сам jwt.decode - хранить их незачем
+        now = time.time()
+        for expired in [k for k, e in self._revoked.items() if e <= now]:
+            del self._revoked[expired]
+
+    def stats(self) -> dict:
+        return {"size": len(self._verified), "revoked": len(self._revoked),
+                "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(maxsize=settings.TOKEN_CACHE_SIZE)
+
+
+async def revoke_tokens(db: AsyncSession, tokens: list[str]):
+    """Отозвать токены во всех воркерах: сразу в этом, в остальных - после синхронизации"""
+    rows = []
+    for token in tokens:
+        key, exp = token_cache.revoke(token)
+        rows.append({"token_hash": key.hex(), "expires_at": datetime.fromtimestamp(exp, timezone.utc)})
+    if rows:
+        await db.execute(pg_insert(RevokedToken).values(rows).on_conflict_do_nothing())
+    await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= func.now()))
+    await db.commit()
+
+
+def is_revoked_clause(token: str):
+    """Условие для запроса: токен есть в revoked_tokens (проверка без ожидания синхронизации)"""
+    return select(RevokedToken.token_hash).where(RevokedToken.token_hash == TokenCache.key(token).hex()).exists()
+
+
+class RevocationSync:
+    """
+    Фоновая подгрузка revoked_tokens в token_cache этого воркера
+
+    Раз в interval секунд читаются строки, отозванные с прошлой проверки.
+    Окно берется с запасом overlap: транзакция с более ранним revoked_at
+    может закоммититься позже, повторная запись в словарь безвредна.
+    """
+    def __init__(self, interval: float, overlap: float = 60.0):
+        self.interval = interval
+        self.overlap = overlap
+        self._task: Optional[asyncio.Task] = None
+        self._since: Optional[datetime] = None
+        self.loaded = 0
+        self.errors = 0
+        self.last_sync: Optional[datetime] = None
+
+    async def sync_once(self) -> int:
+        async with SessionLocal() as db:
+            now = await db.scalar(select(func.now()))
+            stmt = select(RevokedToken.token_hash, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+            if self._since is not None:
+                stmt = stmt.where(RevokedToken.revoked_at > self._since - timedelta(seconds=self.overlap))
+            rows = (await db.execute(stmt)).all()
+        for token_hash, expires_at in rows:
+            token_cache.revoke_key(bytes.fromhex(token_hash), expires_at.timestamp())
+        self._since = now
+        self.loaded += len(rows)
+        self.last_sync = datetime.now()
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Ошибка синхронизации отозванных токенов: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"loaded": self.loaded, "errors": self.errors,
+                "last_sync": self.last_sync.isoformat() if self.last_sync else None}
+
+
+revocation_sync = RevocationSync(interval=settings.TOKEN_REVOCATION_SYNC_SECONDS)
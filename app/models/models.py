@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, ForeignKey, Table, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, LargeBinary, ForeignKey, Table, Boolean, Index, UniqueConstraint, text
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from sqlalchemy.dialects.postgresql import JSONB
 
 from datetime import datetime
 
@@ -13,7 +13,9 @@ Base = declarative_base()
 cert_pc_association = Table(
     'cert_pc', Base.metadata,
     Column('pc_id', Integer, ForeignKey('pcs.pc_id', ondelete="CASCADE"), primary_key=True),
-    Column('cert_id', Integer, ForeignKey('certs.cert_id', ondelete="CASCADE"), primary_key=True)
+    Column('cert_id', Integer, ForeignKey('certs.cert_id', ondelete="CASCADE"), primary_key=True),
+    # Поиск ПК по сертификату: перенос сертификата на отчитавшийся ПК, каскад при удалении
+    Index("ix_cert_pc_cert_id", "cert_id"),
 )
 
 # Таблица Services ↔ PCs
@@ -32,7 +34,7 @@ class TelegramUser(Base):
     id = Column(Integer, primary_key=True)
     telegram_id = Column(Integer, unique=True)  # ID в Telegram
     username = Column(String(255), unique=True, nullable=False)  # @username
-    chat_id = Column(Integer, nullable=False)  # для отправки сообщений
+    chat_id = Column(BigInteger, nullable=False, unique=True, index=True)  # для отправки сообщений (id групп не влезают в int4)
     is_active = Column(Boolean, nullable=False)
 
 
@@ -40,6 +42,14 @@ class TelegramUser(Base):
         return f"<TelegramUser {self.username}>"
 
 
+class TelegramPollState(Base):
+    """Последний обработанный update_id getUpdates (одна строка, id = 1)"""
+    __tablename__ = "telegram_poll_state"
+
+    id = Column(Integer, primary_key=True)
+    last_update_id = Column(BigInteger, nullable=False)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -49,11 +59,23 @@ class User(Base):
     tg_alert = Column(String)
 
 
+class RevokedToken(Base):
+    """Отозванные JWT (logout, смена пароля), общие для всех воркеров; хранятся до exp"""
+    __tablename__ = "revoked_tokens"
+
+    token_hash = Column(String(64), primary_key=True)  # SHA-256 токена, hex
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"), index=True)
+
+
 class Person(Base):
     __tablename__ = "persons"
+    __table_args__ = (
+        Index("ix_persons_email_person_id", "email", "person_id"),
+    )
 
     person_id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
+    name = Column(String, unique=True, index=True)
     phone = Column(String)
     email = Column(String)
 
@@ -61,16 +83,33 @@ class Person(Base):
     cert = relationship("Cert", back_populates="person", cascade="all, delete", passive_deletes=True)
 
 
+class CertBlob(Base):
+    """Файл сертификата, адресуется SHA-256 содержимого (одинаковые файлы хранятся один раз)"""
+    __tablename__ = "cert_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    data = deferred(Column(LargeBinary, nullable=False))
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
 class Cert(Base):
     __tablename__ = "certs"
+    # Индексы под keyset-пагинацию списков: (поле сортировки, первичный ключ)
+    __table_args__ = (
+        Index("ix_certs_date_to_cert_id", "date_to", "cert_id"),
+        Index("ix_certs_name_cert_id", "name", "cert_id"),
+        Index("ix_certs_org_cert_id", "org", "cert_id"),
+    )
 
     cert_id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String)
     version = Column(String)
     date_from = Column(DateTime)
     date_to = Column(DateTime)
-    thumbprint = Column(String)
-    certificate = Column(LargeBinary)
+    thumbprint = Column(String, unique=True, index=True)
+    # Сам файл - в cert_blobs, списки сертификатов его не читают
+    blob_sha256 = Column(String(64), ForeignKey("cert_blobs.sha256"))
     org = Column(String)
 
     # Внешние ключи
@@ -89,17 +128,36 @@ class Cert(Base):
     @property
     def days_until_expiry(self):
         """Дней до истечения срока действия"""
-        if not self.Date_to:
+        if not self.date_to:
             return None
         today = datetime.now().date()
-        return (self.Date_to - today).days
+        return (self.date_to.date() - today).days
+
+
+class CertAlert(Base):
+    """Отправленное уведомление об истечении: одно на сертификат и окно (30/14/7/1 дней)"""
+    __tablename__ = "cert_alerts"
+    __table_args__ = (
+        UniqueConstraint("cert_id", "window_days"),
+    )
+
+    alert_id = Column(Integer, primary_key=True, autoincrement=True)
+    cert_id = Column(Integer, ForeignKey("certs.cert_id", ondelete="CASCADE"), nullable=False)
+    window_days = Column(Integer, nullable=False)
+    sent_at = Column(DateTime, nullable=False)
 
 
 class PC(Base):
     __tablename__ = 'pcs'
+    __table_args__ = (
+        Index("ix_pcs_name_pc_id", "name", "pc_id"),
+        Index("ix_pcs_aud_pc_id", "aud", "pc_id"),
+        # "Последний отчет": сортировка и поиск ПК, молчащих N дней
+        Index("ix_pcs_timestamp_pc_id", "timestamp", "pc_id"),
+    )
 
     pc_id = Column(Integer, primary_key=True, autoincrement=True)
-    domain_name = Column(String)
+    domain_name = Column(String, unique=True, index=True)
 
     aud = Column(String)
     email = Column(String)
@@ -107,20 +165,58 @@ class PC(Base):
     name = Column(String)
 
     spec = Column(JSONB)
-    spec_history = Column(ARRAY(JSONB))
+    spec_hash = Column(String(64))  # spec_check.spec_hash: отчет без изменений железа не переписывает spec
 
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime(timezone=True))  # последний отчет агента
 
     # Связи Many-to-Many
     cert = relationship("Cert", secondary=cert_pc_association, back_populates="pc", cascade="all, delete")
     service = relationship("Service", secondary=service_pc_association, back_populates="pc", cascade="all, delete")
 
 
+class PCSpecChange(Base):
+    """Изменение одного значения в характеристиках ПК (история только дописывается)"""
+    __tablename__ = "pc_spec_changes"
+    __table_args__ = (
+        Index("ix_pc_spec_changes_pc_id_timestamp", "pc_id", "timestamp", "change_id"),
+    )
+
+    change_id = Column(Integer, primary_key=True, autoincrement=True)
+    pc_id = Column(Integer, ForeignKey("pcs.pc_id", ondelete="CASCADE"), nullable=False)
+    component = Column(String(32), nullable=False)  # motherboard / cpu / gpu / ram / storage
+    path = Column(String, nullable=False)  # ram.modules[1].speed или просто ram
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    old = Column(JSONB)
+    new = Column(JSONB)
+
+
 class Service(Base):
     __tablename__ = 'services'
+    __table_args__ = (
+        Index("ix_services_name_service_id", "name", "service_id"),
+        Index("ix_services_url_service_id", "url", "service_id"),
+    )
 
     service_id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String)
     url = Column(String)
 
-    pc = relationship("PC", secondary=service_pc_association, back_populates="service")
\ No newline at end of file
+    pc = relationship("PC", secondary=service_pc_association, back_populates="service")
+
+
+class TelegramOutbox(Base):
+    """Исходящее сообщение Telegram: удаляется после доставки, при ошибке ждет повтора"""
+    __tablename__ = "telegram_outbox"
+    __table_args__ = (
+        # Очередь читается только по неотправленным и еще живым сообщениям
+        Index("ix_telegram_outbox_due", "next_attempt_at", postgresql_where=text("NOT failed")),
+    )
+
+    outbox_id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, nullable=False)
+    message = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(String(255))
+    failed = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False)
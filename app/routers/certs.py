@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, File, UploadFile, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, Request, HTTPException, File, UploadFile, Form, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app.database import get_db
-from app.models.models import Cert, Person
-
-from app.utils import cert_info
-from datetime import datetime
+from app.models.models import Cert, CertBlob, Person
+
+from app.utils import cert_blobs, cert_info
+from app.utils.pagination import Page, paginate, next_page_url
+from app.utils.streaming import stream_rows, stream_template
+from dataclasses import asdict
+from datetime import date, datetime
+from typing import Annotated, Literal, Optional
 import json
 
 
@@ -17,19 +23,74 @@ router.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 
+CERT_SORT = {"name": Cert.name, "date_to": Cert.date_to, "org": Cert.org, "id": Cert.cert_id}
+
+
+async def cert_page(
+        sort: Literal["name", "date_to", "org", "id"] = "date_to",
+        desc: bool = False,
+        cursor: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        q: Optional[str] = None,
+        org: Optional[str] = None,
+        person_id: Optional[int] = None,
+        expires_after: Optional[date] = None,
+        expires_before: Optional[date] = None,
+        db: AsyncSession = Depends(get_db),
+) -> Page:
+    stmt = select(Cert).options(selectinload(Cert.person), selectinload(Cert.pc))
+    if q:
+        stmt = stmt.where(Cert.name.ilike(f"%{q}%"))
+    if org:
+        stmt = stmt.where(Cert.org == org)
+    if person_id is not None:
+        stmt = stmt.where(Cert.person_id == person_id)
+    if expires_after:
+        stmt = stmt.where(Cert.date_to >= expires_after)
+    if expires_before:
+        stmt = stmt.where(Cert.date_to < expires_before)
+    return await paginate(db, stmt, CERT_SORT[sort], Cert.cert_id, limit, cursor, desc)
+
+
+def cert_to_dict(cert: Cert) -> dict:
+    return {
+        "cert_id": cert.cert_id,
+        "name": cert.name,
+        "person": cert.person.name if cert.person else None,
+        "org": cert.org,
+        "date_from": f"{cert.date_from:%Y-%m-%d}" if cert.date_from else None,
+        "date_to": f"{cert.date_to:%Y-%m-%d}" if cert.date_to else None,
+        "is_active": cert.is_active if cert.date_to else None,
+        "pcs": [pc.domain_name for pc in cert.pc],
+    }
+
+
 @router.get("/add", response_class=HTMLResponse)
-async def add_cert_page(request: Request, db: Session = Depends(get_db)):
-    certs = db.query(Cert).all()
-    persons = db.query(Person).all()
-    return templates.TemplateResponse("add_cert.html", {"request": request, "certs": certs, "persons": persons})
+async def add_cert_page(request: Request, db: AsyncSession = Depends(get_db)):
+    page = await cert_page(db=db)
+    return stream_template("add_cert.html", {
+        "request": request,
+        "certs": page.items,
+        "persons": stream_rows(db, select(Person).order_by(Person.name)),
+        "next_url": next_page_url(request, page, "/cert/list_cert_partical"),
+    })
+
+
+@router.get("/list")
+async def list_certs(page: Page = Depends(cert_page)):
+    return {"items": [cert_to_dict(cert) for cert in page.items], "next_cursor": page.next_cursor}
 
 
 @router.post("/file")
-async def parse_cert(cert_file: UploadFile = File(...), db: Session = Depends(get_db)):
-    cert = await cert_info.get_subject(cert_file)
+async def parse_cert(cert_file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    try:
+        parsed = await cert_info.get_subject(cert_file)
+    except cert_info.ParsePoolBusy:
+        raise HTTPException(503, "Сервер занят разбором сертификатов, повторите позже")
+    cert = asdict(parsed)
     cert["filename"] = cert_file.filename
 
-    person = db.query(Person).filter(Person.name == cert["subject"]).first()
+    person = (await db.scalars(select(Person).where(Person.name == cert["subject"]))).first()
     # print(person.person_id)
     try:
         cert["person_id"] = person.person_id
@@ -38,9 +99,28 @@ async def parse_cert(cert_file: UploadFile = File(...), db: Session = Depends(ge
     return cert
 
 
+@router.get("/download/{id}")
+async def download_cert(id: int, db: AsyncSession = Depends(get_db)):
+    row = (await db.execute(
+        select(Cert.thumbprint, CertBlob.sha256, CertBlob.size)
+        .join(CertBlob, CertBlob.sha256 == Cert.blob_sha256)
+        .where(Cert.cert_id == id)
+    )).first()
+    if row is None:
+        raise HTTPException(404, "Файл сертификата не найден")
+    thumbprint, sha256, size = row
+    return StreamingResponse(
+        cert_blobs.stream_blob(db, sha256, size),
+        media_type="application/pkix-cert",
+        headers={"Content-Disposition": f'attachment; filename="{thumbprint}.cer"',
+                 "Content-Length": str(size),
+                 "ETag": f'"{sha256}"'},
+    )
+
+
 @router.get("/edit/{id}")
-async def add_cert_page(id: int, db: Session = Depends(get_db)):
-    cert = db.query(Cert).get(id)
+async def add_cert_page(id: int, db: AsyncSession = Depends(get_db)):
+    cert = await db.get(Cert, id)
     return {
         "name": cert.name,
         "version": cert.version,
@@ -53,16 +133,16 @@ async def add_cert_page(id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/list_cert_partical", response_class=HTMLResponse)
-async def list_cert_partical(request: Request, db: Session = Depends(get_db)):
-    certs = db.query(Cert).all()
-    persons = db.query(Person).all()
-    return templates.TemplateResponse("list_cert_partical.html", {"request": request, "certs": certs, "persons": persons})
+async def list_cert_partical(request: Request, page: Page = Depends(cert_page)):
+    return templates.TemplateResponse("list_cert_partical.html", {
+        "request": request, "certs": page.items, "next_url": next_page_url(request, page),
+    })
 
 
 @router.post("/add")
 async def add_cert(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     try:
         data = await request.json()
@@ -81,10 +161,10 @@ async def add_cert(
                            date_to=datetime.strptime(date_to, "%Y-%m-%d").date(),
                            person_id=person_id,
                            org_id=org_id,
-                           person=db.query(Person).get(person_id),
+                           person=await db.get(Person, person_id),
                     )
     db.add(new_cert)
-    db.commit()
+    await db.commit()
     return RedirectResponse("/add_cert", status_code=303)
 
 
@@ -92,10 +172,10 @@ async def add_cert(
 async def edit_cert(
         id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 
 ):
-    cert = db.query(Cert).get(id)
+    cert = await db.get(Cert, id)
     try:
         data = await request.json()
         cert.name = data["name"]
@@ -107,7 +187,7 @@ async def edit_cert(
     except json.JSONDecodeError:
         raise HTTPException(400, "Невалидный JSON")
 
-    db.commit()
+    await db.commit()
     return RedirectResponse("/add_cert", status_code=303)
 
 
@@ -115,11 +195,12 @@ async def edit_cert(
 async def delete_org(
         request: Request,
         id: str = Form(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 
 ):
-    deleted_cert = db.query(Cert).get(id)
+    deleted_cert = await db.get(Cert, int(id))
     if deleted_cert:
-        db.delete(deleted_cert)
-        db.commit()
+        await db.delete(deleted_cert)
+        await db.commit()
+        cert_info.cache.discard_cert(int(id))
     return RedirectResponse("/add_cert", status_code=303)
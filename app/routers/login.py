@@ -1,19 +1,20 @@
-from fastapi import APIRouter, Depends, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordRequestForm
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models.models import User
 
-from app.middleware.hash_tokens import verify_password, create_access_token, create_refresh_token, get_password_hash
+from app.middleware.hash_tokens import (verify_password_async, hash_password_async, needs_rehash,
+                                       create_access_token, create_refresh_token, HashPoolBusy)
+from app.middleware.token_cache import revoke_tokens, token_cache
 
 from app.config import get_settings
 
-from jose import JWTError, jwt
-
 settings = get_settings()
 
 
@@ -27,8 +28,14 @@ async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 
+async def revoke_session_tokens(request: Request, db: AsyncSession):
+    tokens = [request.cookies.get(cookie) for cookie in (settings.COOKIE_NAME, settings.REFRESH_COOKIE_NAME)]
+    await revoke_tokens(db, [token for token in tokens if token])
+
+
 @router.post("/logout")
-async def logout():
+async def logout(request: Request, db: AsyncSession = Depends(get_db)):
+    await revoke_session_tokens(request, db)
     response = JSONResponse(content={"message": "Logged out"})
     response.delete_cookie(settings.COOKIE_NAME, path="/")
     response.delete_cookie(settings.REFRESH_COOKIE_NAME, path="/")
@@ -36,17 +43,23 @@ async def logout():
 
 
 @router.put("/change_password")
-async def logout(request: Request, response: Response, db: Session = Depends(get_db)):
+async def logout(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     data = await request.json()
     access_token = request.cookies.get(settings.COOKIE_NAME)
-    payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    payload = token_cache.decode(access_token)
     username = payload.get("sub")
-    user = db.query(User).filter(User.login == username).first()
-    if not user or not verify_password(data["old_pass"], user.password):
+    user = await db.scalar(select(User).where(User.login == username))
+    try:
+        valid = user is not None and await verify_password_async(data["old_pass"], user.password)
+        new_hash = await hash_password_async(data["new_pass"]) if valid else None
+    except HashPoolBusy:
+        raise HTTPException(503, "Сервер занят проверкой паролей, повторите позже")
+    if not valid:
         response =  JSONResponse(content={"message": "old password is incorrect"}, status_code=400)
     else:
-        user.password = get_password_hash(data["new_pass"])
-        db.commit()
+        user.password = new_hash
+        await db.commit()
+        await revoke_session_tokens(request, db)
         response = JSONResponse(content={"message": "password changed successfully"}, status_code=200)
         response.delete_cookie(settings.COOKIE_NAME, path="/")
         response.delete_cookie(settings.REFRESH_COOKIE_NAME, path="/")
@@ -55,18 +68,30 @@ async def logout(request: Request, response: Response, db: Session = Depends(get
 
 
 @router.post("/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     OAuth2PasswordRequestForm автоматически достает из формы поля:
     - username
     - password
     """
     # 1. Ищем пользователя в БД
-    user = db.query(User).filter(User.login == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password):
+    user = await db.scalar(select(User).where(User.login == form_data.username))
+    try:
+        valid = user is not None and await verify_password_async(form_data.password, user.password)
+    except HashPoolBusy:
+        raise HTTPException(503, "Сервер занят проверкой паролей, повторите позже")
+    if not valid:
         #raise HTTPException(400, "Неверный логин или пароль")
         return RedirectResponse(url="/auth/login", status_code=303)
 
+    # 2. Хэш с устаревшим cost пересчитываем, пока пароль известен; при занятом пуле - в другой раз
+    if needs_rehash(user.password):
+        try:
+            user.password = await hash_password_async(form_data.password)
+            await db.commit()
+        except HashPoolBusy:
+            pass
+
     # 3. Создаем токен
     access_token = create_access_token(data={"sub": user.login})
     refresh_token = create_refresh_token(data={"sub": user.login})
@@ -97,7 +122,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 # async def login_get(
 #         username: str = Form(...),
 #         password: str = Form(...),
-#         db: Session = Depends(get_db)
+#         db: AsyncSession = Depends(get_db)
 # ):
 #     existing_user = db.query(models.User).filter(models.User.login == username).first()
 #     if existing_user:
@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+
+from app.database import pool_metrics
+from app.middleware.hash_tokens import hash_metrics
+from app.middleware.token_cache import revocation_sync, token_cache
+from app.utils import cert_info, expiry_alerts, ingest_queue, leader, spec_check, tg_outbox, tg_updates
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("")
+async def get_metrics():
+    return {
+        "cert_parse_pool": cert_info.pool.stats(),
+        "cert_cache": cert_info.cache.stats(),
+        "db_pool": pool_metrics.stats(),
+        "token_cache": token_cache.stats(),
+        "token_revocations": revocation_sync.stats(),
+        "password_hashing": hash_metrics.stats(),
+        "pc_reports": spec_check.spec_metrics.stats(),
+        "ingest_queue": ingest_queue.queue.stats(),
+        "expiry_scanner": expiry_alerts.scheduler.stats(),
+        "telegram_outbox": tg_outbox.worker.stats(),
+        "telegram_updates": tg_updates.poller.stats(),
+        "background_leader": leader.leader.stats(),
+    }
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app.database import get_db
-from app.models.models import Cert,  PC
+from app.models.models import Cert, PC, cert_pc_association
+
+from datetime import datetime
 
 
 router = APIRouter(prefix="/monitor_pc", tags=["monitor_pc"])
@@ -14,7 +18,37 @@ templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/show/tree", response_class=HTMLResponse)
-async def add_pc_page(request: Request, db: Session = Depends(get_db)):
-    pcs = db.query(PC).all()
-    certs = db.query(Cert).all()
-    return templates.TemplateResponse("pc_cert_tree.html", {"request": request, "pcs": pcs, "certs": certs})
+async def add_pc_page(request: Request, db: AsyncSession = Depends(get_db)):
+    # Верхний уровень дерева: ПК и число действующих/просроченных сертификатов одним запросом
+    today = datetime.now().date()
+    pcs = (await db.execute(
+        select(
+            PC.pc_id, PC.domain_name, PC.name,
+            # Сертификат без даты окончания (заведен вручную) считается действующим
+            func.count(Cert.cert_id).filter(or_(func.date(Cert.date_to) >= today, Cert.date_to.is_(None))).label("active"),
+            func.count(Cert.cert_id).filter(func.date(Cert.date_to) < today).label("expired"),
+        )
+        .outerjoin(cert_pc_association, cert_pc_association.c.pc_id == PC.pc_id)
+        .outerjoin(Cert, Cert.cert_id == cert_pc_association.c.cert_id)
+        .group_by(PC.pc_id)
+        .order_by(PC.domain_name)
+    )).all()
+    return templates.TemplateResponse("pc_cert_tree.html", {"request": request, "pcs": pcs})
+
+
+@router.get("/show/tree/{pc_id}", response_class=HTMLResponse)
+async def pc_tree_node(pc_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    pc = await db.get(PC, pc_id, options=[
+        selectinload(PC.cert).load_only(Cert.name, Cert.date_from, Cert.date_to)
+    ])
+    if pc is None:
+        raise HTTPException(404, "PC not found")
+
+    today = datetime.now().date()
+    active, expired = [], []
+    # date_to может быть NULL: такие сертификаты - в конце списка действующих
+    for cert in sorted(pc.cert, key=lambda cert: (cert.date_to is None, cert.date_to or datetime.max)):
+        (expired if cert.date_to is not None and cert.date_to.date() < today else active).append(cert)
+    return templates.TemplateResponse("pc_cert_tree_node.html", {
+        "request": request, "pc": pc, "active": active, "expired": expired,
+    })
@@ -1,87 +1,159 @@
-from fastapi import APIRouter, Request, File, UploadFile, Depends, status
+from fastapi import APIRouter, Request, HTTPException, status
 from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from typing import Annotated
-from app.utils import cert_info, spec_check
+import hashlib
+from app.utils import agent_protocol, cert_info, ingest, ingest_queue
+from app.utils.uploads import UploadedFile, read_uploads
 
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.models import Cert, Person, PC
+from app.database import SessionLocal, count_queries
 
-from datetime import datetime
+from app.config import get_settings
 
 
+settings = get_settings()
+
 router = APIRouter(prefix="/parcer", tags=["parcer"])
 router.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 
+async def enqueue(report: ingest_queue.PendingReport):
+    try:
+        await ingest_queue.queue.put(report)
+    except ingest_queue.IngestQueueFull:
+        raise HTTPException(503, "Очередь отчетов переполнена, повторите позже",
+                            headers={"Retry-After": str(int(settings.INGEST_RETRY_SECONDS))})
+
+
 @router.post("/cert/{domain_name}/{user}")
-async def cert(
-    user: str,
-    domain_name: str,
-    files: Annotated[
-        list[UploadFile], File(description="Multiple files as UploadFile")
-    ],
-    db: Session = Depends(get_db)
-):
-    if len(files) == 0:
+async def cert(user: str, domain_name: str, request: Request):
+    # 1. Каждый файл читается из тела запроса один раз, лимиты - по ходу чтения
+    uploads = await read_uploads(request, settings.CERT_UPLOAD_MAX_FILES, settings.CERT_UPLOAD_MAX_FILE_BYTES)
+    if len(uploads) == 0:
         return JSONResponse(status_code=status.HTTP_201_CREATED, content="No file was uploaded")
 
-    for file in files:
-        data = await cert_info.get_subject(file)
-        pc = db.query(PC).filter(PC.domain_name == domain_name).first()
-        cert = db.query(Cert).filter(Cert.thumbprint == data["thumbprint"]).first()
-        if cert:
-            cert.pc = [pc]
-        else:
-            person = db.query(Person).filter(Person.name == data["surname"] + " " + data["given_name"]).first()
-            if person is None:
-                person = Person(
-                    name = data["surname"] + " " + data["given_name"],
-                )
-                db.add(person)
-
-            new_cert = Cert(name=data["subject"],
-                            date_from=data["date_from"],
-                            date_to=data["date_to"],
-                            thumbprint = data["thumbprint"],
-                            org = data["issuer"],
-                            certificate = await file.read(),
-                            person_id = person.person_id,
-                            person = person,
-                            pc = [pc],
-                            )
-            db.add(new_cert)
-        db.commit()
-    return JSONResponse(status_code=status.HTTP_201_CREATED, content="File was uploaded")
+    # 2. Разбираем все файлы до обращения к БД
+    try:
+        results, pending = await ingest_queue.prepare_report(domain_name, user, uploads=uploads)
+    except cert_info.ParsePoolBusy:
+        raise HTTPException(503, "Сервер занят разбором сертификатов, повторите позже")
 
+    # 3. Запись в БД - фоном, пачками вместе с отчетами других ПК
+    if settings.INGEST_QUEUE_ENABLED:
+        await enqueue(pending)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"status": "queued", "files": results})
+
+    # Без очереди соединение с БД берется только здесь
+    async with SessionLocal() as db, count_queries(db) as counter:
+        # ПК, сертификаты и связи cert_pc - в одной транзакции
+        (applied,), created = await ingest.apply_reports(db, [pending])
+
+    for result in results:
+        if "thumbprint" in result:
+            result["status"] = "created" if result["thumbprint"] in created else "exists"
+    return JSONResponse(status_code=status.HTTP_201_CREATED, content={
+        "files": results,
+        "created": len(created),
+        "linked": applied["linked"],
+        "round_trips": counter.count,
+    })
 
 
 @router.post("/pc/{domain_name}/{user}")
-async def pc(user: str, domain_name: str, request: Request, db: Session = Depends(get_db)):
-    data = await request.json()
-    pc = db.query(PC).filter(PC.domain_name == domain_name).first()
-    if pc:
-        if pc.spec != data:
-            history = spec_check.compare(pc.spec, data)
-            pc.spec = data
-            pc.timestamp = datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-            try:
-                pc.spec_history = pc.spec_history + history
-            except TypeError:
-                pc.spec_history = history
-        else:
-            pc.timestamp = datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-    else:
-        new_pc = PC(
-            domain_name = domain_name,
-            name = user,
-            spec = data,
-            timestamp = datetime.now().strftime('%d-%m-%Y %H:%M:%S'),
-        )
-        db.add(new_pc)
-    db.commit()
+async def pc(user: str, domain_name: str, request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise HTTPException(400, "Ожидается JSON-объект с характеристиками")
+
+    if settings.INGEST_QUEUE_ENABLED:
+        await enqueue(ingest_queue.PendingReport(domain_name, user, spec=data))
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content="Spec queued")
+
+    async with SessionLocal() as db:
+        await ingest.save_spec(db, domain_name, user, data)
+        await db.commit()
     return JSONResponse(status_code=status.HTTP_201_CREATED, content="Spec uploaded")
+
+
+# ==================== Протокол v2: один отчет на вход пользователя ====================
+
+def report_max_bytes() -> int:
+    # base64 в JSON раздувает файлы на треть, плюс запас на spec
+    return settings.CERT_UPLOAD_MAX_FILES * settings.CERT_UPLOAD_MAX_FILE_BYTES * 4 // 3 + 1024 * 1024
+
+
+@router.post("/v2/known")
+async def known_certs(request: Request):
+    """
+    Рукопожатие перед отчетом: агент присылает отпечатки своих сертификатов,
+    в ответ получает те, файлы которых серверу нужны
+    """
+    try:
+        data = await request.json()
+        thumbprints = sorted({item.strip().lower() for item in data["thumbprints"]})
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(400, "Ожидается {\"thumbprints\": [...]}")
+    if len(thumbprints) > settings.CERT_UPLOAD_MAX_FILES * 10:
+        raise HTTPException(413, "Слишком много отпечатков")
+    if not thumbprints:
+        return {"version": agent_protocol.VERSION, "missing": []}
+    async with SessionLocal() as db:
+        stored = await ingest.stored_thumbprints(db, thumbprints)
+    return {"version": agent_protocol.VERSION, "missing": [item for item in thumbprints if item not in stored]}
+
+
+@router.post("/v2/report/{domain_name}/{user}")
+async def report(user: str, domain_name: str, request: Request):
+    """
+    Характеристики и сертификаты ПК одним запросом
+
+    Тело - JSON или msgpack (Content-Type), сжатое gzip или zstd
+    (Content-Encoding). Сертификаты, уже известные серверу, передаются только
+    отпечатком и просто привязываются к ПК. С очередью (INGEST_QUEUE_ENABLED)
+    ответ 202 уходит до записи в БД; без нее в ответе missing - отпечатки,
+    файлы которых стоит прислать в следующий раз.
+    """
+    max_bytes = report_max_bytes()
+    body = await agent_protocol.read_body(request, max_bytes)
+    document = agent_protocol.decode_report(
+        body, request.headers.get("content-type", ""), request.headers.get("content-encoding", ""), max_bytes
+    )
+    if len(document.certs) > settings.CERT_UPLOAD_MAX_FILES:
+        raise HTTPException(413, f"Не больше {settings.CERT_UPLOAD_MAX_FILES} файлов за запрос")
+
+    uploads = [UploadedFile(f"cert{n}.cer", data, hashlib.sha256(data).digest())
+               for n, data in enumerate(document.certs)]
+    try:
+        results, pending = await ingest_queue.prepare_report(
+            domain_name, user, document.spec or None, document.thumbprints, uploads
+        )
+    except cert_info.ParsePoolBusy:
+        raise HTTPException(503, "Сервер занят разбором сертификатов, повторите позже")
+
+    if settings.INGEST_QUEUE_ENABLED:
+        await enqueue(pending)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+            "version": agent_protocol.VERSION,
+            "status": "queued",
+            "files": results,
+        })
+
+    async with SessionLocal() as db, count_queries(db) as counter:
+        (applied,), created = await ingest.apply_reports(db, [pending])
+        unknown = set(document.thumbprints) - pending.parsed.keys()
+        missing = sorted(unknown - await ingest.stored_thumbprints(db, unknown)) if unknown else []
+
+    return JSONResponse(status_code=status.HTTP_201_CREATED, content={
+        "version": agent_protocol.VERSION,
+        "spec": applied["spec"],
+        "files": results,
+        "created": len(created),
+        "linked": applied["linked"],
+        "missing": missing,
+        "round_trips": counter.count,
+    })
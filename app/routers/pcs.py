@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, File, UploadFile, Form
+from fastapi import APIRouter, Depends, Request, HTTPException, File, UploadFile, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app.database import get_db
-from app.models.models import Cert, Person, PC, Service
+from app.models.models import Cert, Person, PC, PCSpecChange, Service
+from app.utils.pagination import Page, paginate, next_page_url
+from app.utils.streaming import stream_rows, stream_template
 
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Literal, Optional
 import json
 
 
@@ -16,24 +22,106 @@ templates = Jinja2Templates(directory="app/templates")
 
 
 
+PC_SORT = {"domain_name": PC.domain_name, "name": PC.name, "aud": PC.aud, "id": PC.pc_id, "last_seen": PC.timestamp}
+
+
+async def pc_page(
+        sort: Literal["domain_name", "name", "aud", "id", "last_seen"] = "domain_name",
+        desc: bool = False,
+        cursor: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        q: Optional[str] = None,
+        aud: Optional[str] = None,
+        service_id: Optional[int] = None,
+        not_seen_days: Annotated[Optional[int], Query(ge=0)] = None,
+        never_seen: bool = False,
+        db: AsyncSession = Depends(get_db),
+) -> Page:
+    stmt = select(PC).options(selectinload(PC.cert).selectinload(Cert.person), selectinload(PC.service))
+    if q:
+        stmt = stmt.where(PC.domain_name.ilike(f"%{q}%") | PC.name.ilike(f"%{q}%"))
+    if aud:
+        stmt = stmt.where(PC.aud == aud)
+    if service_id is not None:
+        stmt = stmt.where(PC.service.any(Service.service_id == service_id))
+    if not_seen_days is not None:
+        # Чистый диапазон по индексу (timestamp, pc_id): OR с IS NULL его бы разрушил
+        cutoff = datetime.now(timezone.utc) - timedelta(days=not_seen_days)
+        stmt = stmt.where(PC.timestamp < cutoff)
+    if never_seen:
+        # ПК без единого отчета - отдельным фильтром
+        stmt = stmt.where(PC.timestamp.is_(None))
+    return await paginate(db, stmt, PC_SORT[sort], PC.pc_id, limit, cursor, desc)
+
+
+def pc_to_dict(pc: PC) -> dict:
+    return {
+        "pc_id": pc.pc_id,
+        "domain_name": pc.domain_name,
+        "aud": pc.aud,
+        "name": pc.name,
+        "phone": pc.phone,
+        "email": pc.email,
+        "last_seen": pc.timestamp.isoformat() if pc.timestamp else None,
+        "certs": [{"cert_id": cert.cert_id, "name": cert.name} for cert in pc.cert],
+        "services": [{"service_id": service.service_id, "name": service.name} for service in pc.service],
+    }
+
+
 @router.get("/add", response_class=HTMLResponse)
-async def add_pc_page(request: Request, db: Session = Depends(get_db)):
-    pcs = db.query(PC).all()
-    services = db.query(Service).all()
-    certs = db.query(Cert).all()
-    persons = db.query(Person).all()
-    return templates.TemplateResponse("add_pc.html", {"request": request, "pcs": pcs, "services": services, "certs": certs, "persons": persons})
+async def add_pc_page(request: Request, db: AsyncSession = Depends(get_db)):
+    page = await pc_page(db=db)
+    # Справочники для чекбоксов читаются курсором прямо во время рендера
+    return stream_template("add_pc.html", {
+        "request": request,
+        "pcs": page.items,
+        "services": stream_rows(db, select(Service).order_by(Service.name)),
+        "certs": stream_rows(db, select(Cert).options(selectinload(Cert.person)).order_by(Cert.name)),
+        "next_url": next_page_url(request, page, "/pc/list_pc_partical"),
+    })
+
+
+@router.get("/list")
+async def list_pcs(page: Page = Depends(pc_page)):
+    return {"items": [pc_to_dict(pc) for pc in page.items], "next_cursor": page.next_cursor}
 
 
 @router.get("/list_pc_partical", response_class=HTMLResponse)
-async def list_pc_partical(request: Request, db: Session = Depends(get_db)):
-    pcs = db.query(PC).all()
-    return templates.TemplateResponse("list_pc_partical.html", {"request": request, "pcs": pcs})
+async def list_pc_partical(request: Request, page: Page = Depends(pc_page)):
+    return templates.TemplateResponse("list_pc_partical.html", {
+        "request": request, "pcs": page.items, "next_url": next_page_url(request, page),
+    })
+
+
+@router.get("/history/{pc_id}")
+async def pc_history(
+        pc_id: int,
+        cursor: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        component: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+):
+    """История изменений характеристик ПК, новые сначала (индекс pc_id, timestamp)"""
+    stmt = select(PCSpecChange).where(PCSpecChange.pc_id == pc_id)
+    if component:
+        stmt = stmt.where(PCSpecChange.component == component)
+    page = await paginate(db, stmt, PCSpecChange.timestamp, PCSpecChange.change_id, limit, cursor, desc=True)
+    return {
+        "items": [{
+            "change_id": change.change_id,
+            "component": change.component,
+            "path": change.path,
+            "timestamp": change.timestamp.isoformat(),
+            "old": change.old,
+            "new": change.new,
+        } for change in page.items],
+        "next_cursor": page.next_cursor,
+    }
 
 
 @router.get("/edit/{id}")
-async def edit_pc_get(id: int, db: Session = Depends(get_db)):
-    pc = db.query(PC).get(id)
+async def edit_pc_get(id: int, db: AsyncSession = Depends(get_db)):
+    pc = await db.get(PC, id, options=[selectinload(PC.service), selectinload(PC.cert)])
     if not pc:
         raise HTTPException(404, "PC not found")
     return {
@@ -51,7 +139,7 @@ async def edit_pc_get(id: int, db: Session = Depends(get_db)):
 @router.post("/add")
 async def add_pc(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     try:
         data = await request.json()
@@ -73,13 +161,13 @@ async def add_pc(
     serv = []
     cer = []
     for cservice in services:
-        serv.append(db.query(Service).get(cservice))
+        serv.append(await db.get(Service, cservice))
     for ccert in certs:
-        cer.append(db.query(Cert).get(ccert))
+        cer.append(await db.get(Cert, ccert))
     new_pc.service.extend(serv)
     new_pc.cert.extend(cer)
     db.add(new_pc)
-    db.commit()
+    await db.commit()
     return RedirectResponse("/pc/add", status_code=303)
 
 
@@ -87,10 +175,10 @@ async def add_pc(
 async def edit_pc(
         id: int,
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
 
-    pc = db.query(PC).get(id)
+    pc = await db.get(PC, id, options=[selectinload(PC.service), selectinload(PC.cert)])
     if not pc:
         return HTTPException(404, f"PC {id} not found")
 
@@ -112,10 +200,10 @@ async def edit_pc(
     pc.name = name
     pc.phone = phone
     pc.email = email
-    pc.service = db.query(Service).filter(Service.service_id.in_(services)).all()
-    pc.cert = db.query(Cert).filter(Cert.cert_id.in_(certs)).all()
+    pc.service = (await db.scalars(select(Service).where(Service.service_id.in_(services)))).all()
+    pc.cert = (await db.scalars(select(Cert).where(Cert.cert_id.in_(certs)))).all()
 
-    db.commit()
+    await db.commit()
 
     return {"success": True, "message": "Сертификат обновлен"}
 
@@ -124,11 +212,11 @@ async def edit_pc(
 async def delete_pc(
         request: Request,
         id: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
 
-    deleted_pc = db.query(PC).get(id)
+    deleted_pc = await db.get(PC, int(id))
     if deleted_pc:
-        db.delete(deleted_pc)
-        db.commit()
+        await db.delete(deleted_pc)
+        await db.commit()
     return RedirectResponse("/pc/add", status_code=303)
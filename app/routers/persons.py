@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, HTTPException, Form, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from fastapi.templating import Jinja2Templates
 from app.database import get_db
 from app.models.models import Person
 from fastapi.responses import HTMLResponse, RedirectResponse
+from app.utils.pagination import Page, paginate, next_page_url
+from typing import Annotated, Literal, Optional
 import json
 from fastapi.staticfiles import StaticFiles
 
@@ -12,28 +16,58 @@ router = APIRouter(prefix="/person", tags=["persons"])
 router.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
+PERSON_SORT = {"name": Person.name, "email": Person.email, "id": Person.person_id}
+
+
+async def person_page(
+        sort: Literal["name", "email", "id"] = "name",
+        desc: bool = False,
+        cursor: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        q: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+) -> Page:
+    stmt = select(Person)
+    if q:
+        stmt = stmt.where(Person.name.ilike(f"%{q}%"))
+    return await paginate(db, stmt, PERSON_SORT[sort], Person.person_id, limit, cursor, desc)
+
+
 @router.get("/add", response_class=HTMLResponse)
-async def add_person_page(request: Request, db: Session = Depends(get_db)):
-    users = db.query(Person).all()
-    return templates.TemplateResponse("add_person.html", {"request": request, "users": users})
+async def add_person_page(request: Request, db: AsyncSession = Depends(get_db)):
+    page = await person_page(db=db)
+    return templates.TemplateResponse("add_person.html", {
+        "request": request, "users": page.items,
+        "next_url": next_page_url(request, page, "/person/list_person_partical"),
+    })
+
+
+@router.get("/list")
+async def list_persons(page: Page = Depends(person_page)):
+    return {
+        "items": [{"person_id": p.person_id, "name": p.name, "phone": p.phone, "email": p.email}
+                  for p in page.items],
+        "next_cursor": page.next_cursor,
+    }
 
 
 @router.get("/edit/{id}")
-async def add_person_page(id: int, db: Session = Depends(get_db)):
-    user = db.query(Person).get(id)
+async def add_person_page(id: int, db: AsyncSession = Depends(get_db)):
+    user = await db.get(Person, id)
     return {"name": user.name, "phone": user.phone, "email": user.email}
 
 
 @router.get("/list_person_partical", response_class=HTMLResponse)
-async def list_person_partical(request: Request, db: Session = Depends(get_db)):
-    users = db.query(Person).all()
-    return templates.TemplateResponse("list_person_partical.html", {"request": request, "users": users})
+async def list_person_partical(request: Request, page: Page = Depends(person_page)):
+    return templates.TemplateResponse("list_person_partical.html", {
+        "request": request, "users": page.items, "next_url": next_page_url(request, page),
+    })
 
 
 @router.post("/add")
 async def add_person(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
 
     try:
@@ -43,24 +77,25 @@ async def add_person(
         email = data["email"]
     except json.JSONDecodeError:
         raise HTTPException(400, "Невалидный JSON")
-    pers = db.query(Person).filter(Person.name == name).first()
-    if pers:
-        return {"code": 400, "person_id": pers.person_id}
-    else:
-        new_person = Person(name=name, email=email, phone=phone)
-        # Сохраняем в БД
-        db.add(new_person)
-        db.commit()
-        pers = db.query(Person).filter(Person.name == name).first()
+    person_id = await db.scalar(
+        pg_insert(Person)
+        .values(name=name, email=email, phone=phone)
+        .on_conflict_do_nothing(index_elements=[Person.name])
+        .returning(Person.person_id)
+    )
+    if person_id is None:
+        existing_id = await db.scalar(select(Person.person_id).where(Person.name == name))
+        return {"code": 400, "person_id": existing_id}
+    await db.commit()
 
-    return {"person_id": pers.person_id, "name": pers.name}
+    return {"person_id": person_id, "name": name}
 
 
 @router.put("/edit/{id}")
 async def edit_person(
         id: int,
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     try:
         data = await request.json()
@@ -70,12 +105,12 @@ async def edit_person(
     except json.JSONDecodeError:
         raise HTTPException(400, "Невалидный JSON")
 
-    person = db.query(Person).get(id)
+    person = await db.get(Person, id)
     person.name = name
     person.phone = phone
     person.email = email
 
-    db.commit()
+    await db.commit()
 
     return RedirectResponse("person/add", status_code=303)
 
@@ -84,10 +119,10 @@ async def edit_person(
 async def delete_person(
         request: Request,
         id: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    deleted_person = db.query(Person).get(id)
+    deleted_person = await db.get(Person, int(id))
     if deleted_person:
-        db.delete(deleted_person)
-        db.commit()
+        await db.delete(deleted_person)
+        await db.commit()
     return RedirectResponse("/person/add", status_code=303)
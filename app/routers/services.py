@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, Form
+from fastapi import APIRouter, Depends, Request, HTTPException, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models.models import Service
+from app.utils.pagination import Page, paginate, next_page_url
 
+from typing import Annotated, Literal, Optional
 import json
 
 
@@ -15,20 +18,49 @@ router.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 
+SERVICE_SORT = {"name": Service.name, "url": Service.url, "id": Service.service_id}
+
+
+async def service_page(
+        sort: Literal["name", "url", "id"] = "name",
+        desc: bool = False,
+        cursor: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        q: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+) -> Page:
+    stmt = select(Service)
+    if q:
+        stmt = stmt.where(Service.name.ilike(f"%{q}%") | Service.url.ilike(f"%{q}%"))
+    return await paginate(db, stmt, SERVICE_SORT[sort], Service.service_id, limit, cursor, desc)
+
+
 @router.get("/add", response_class=HTMLResponse)
-async def add_service_page(request: Request, db: Session = Depends(get_db)):
-    services = db.query(Service).all()
-    return templates.TemplateResponse("add_service.html", {"request": request, "services": services})
+async def add_service_page(request: Request, db: AsyncSession = Depends(get_db)):
+    page = await service_page(db=db)
+    return templates.TemplateResponse("add_service.html", {
+        "request": request, "services": page.items,
+        "next_url": next_page_url(request, page, "/service/list_service_partical"),
+    })
+
+
+@router.get("/list")
+async def list_services(page: Page = Depends(service_page)):
+    return {
+        "items": [{"service_id": s.service_id, "name": s.name, "url": s.url} for s in page.items],
+        "next_cursor": page.next_cursor,
+    }
 
 
 @router.get("/list_service_partical", response_class=HTMLResponse)
-async def list_service_partical(request: Request, db: Session = Depends(get_db)):
-    services = db.query(Service).all()
-    return templates.TemplateResponse("list_service_partical.html", {"request": request, "services": services})
+async def list_service_partical(request: Request, page: Page = Depends(service_page)):
+    return templates.TemplateResponse("list_service_partical.html", {
+        "request": request, "services": page.items, "next_url": next_page_url(request, page),
+    })
 
 @router.get("/edit/{id}")
-async def edit_service_get(id: int, db: Session = Depends(get_db)):
-    services = db.query(Service).get(id)
+async def edit_service_get(id: int, db: AsyncSession = Depends(get_db)):
+    services = await db.get(Service, id)
     return {"name": services.name, "url": services.url}
 
 
@@ -36,9 +68,9 @@ async def edit_service_get(id: int, db: Session = Depends(get_db)):
 async def edit_service(
         id: int,
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    service = db.query(Service).get(id)
+    service = await db.get(Service, id)
     try:
         data = await request.json()
         service.name = data["name"]
@@ -46,7 +78,7 @@ async def edit_service(
     except json.JSONDecodeError:
         raise HTTPException(400, "Невалидный JSON")
 
-    db.commit()
+    await db.commit()
     return RedirectResponse("/org/add", status_code=303)
 
 
@@ -55,13 +87,12 @@ async def add_service(
         request: Request,
         name: str = Form(...),
         url: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     new_service = Service(name=name, url=url)
     # Сохраняем в БД
     db.add(new_service)
-    db.commit()
-    db.refresh(new_service)
+    await db.commit()
 
     return RedirectResponse("/service/add", status_code=303)
 
@@ -70,11 +101,11 @@ async def add_service(
 async def delete_service(
         request: Request,
         id: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
 
-    deleted_service = db.query(Service).get(id)
+    deleted_service = await db.get(Service, int(id))
     if deleted_service:
-        db.delete(deleted_service)
-        db.commit()
+        await db.delete(deleted_service)
+        await db.commit()
     return RedirectResponse("/service/add", status_code=303)
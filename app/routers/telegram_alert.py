@@ -1,46 +1,51 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models.models import TelegramUser
 
-from app.utils import tg_bot_alert
-
 
 router = APIRouter(prefix="/telegram_alert", tags=["telegram_alert"])
 router.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 
-tg_bot = tg_bot_alert.TelegramBot()
-
-
 @router.get("/show", response_class=HTMLResponse)
-async def get_tg_chats(request: Request, db: Session = Depends(get_db)):
-
-    chats = tg_bot.get_chat_ids()
-    for chat in chats:
-        if db.query(TelegramUser).filter(TelegramUser.chat_id == chat["chat_id"]).first() is None:
-            new_tg_user = TelegramUser(
-                chat_id=chat["chat_id"],
-                username=chat["username"],
-                is_active=False
-            )
-            db.add(new_tg_user)
-    db.commit()
-    tg_users = db.query(TelegramUser).all()
+async def get_tg_chats(request: Request, db: AsyncSession = Depends(get_db)):
+    # Новые чаты пишет в БД фоновый tg_updates.poller, страница в Telegram не ходит
+    tg_users = (await db.scalars(select(TelegramUser).order_by(TelegramUser.id))).all()
 
     return templates.TemplateResponse("telegram_alert.html", {"request": request, "tg_users": tg_users})
 
 
 @router.post("/update_alert")
-async def update_tg_alert(request: Request, db: Session = Depends(get_db)):
+async def update_tg_alert(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Применить выбранный набор подписчиков целиком
+
+    Отмеченные чаты включаются, все остальные выключаются - одним UPDATE,
+    который трогает только строки с изменившимся is_active и возвращает их.
+    """
     data = await request.json()
-    for chat in data["chats"]:
-        tg_user = db.query(TelegramUser).filter(TelegramUser.chat_id == chat).first()
-        tg_user.is_active = True
-        db.commit()
-    return JSONResponse(content={"message": "Logged out"}, status_code=200)
\ No newline at end of file
+    try:
+        chat_ids = {int(chat) for chat in data["chats"]}
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(400, "Ожидается {\"chats\": [chat_id, ...]}")
+
+    selected = TelegramUser.chat_id.in_(chat_ids)
+    changed = (await db.execute(
+        update(TelegramUser)
+        .where(TelegramUser.is_active.is_distinct_from(selected))
+        .values(is_active=selected)
+        .returning(TelegramUser.chat_id, TelegramUser.username, TelegramUser.is_active)
+    )).all()
+    await db.commit()
+
+    return JSONResponse(content={
+        "activated": [{"chat_id": chat_id, "username": username} for chat_id, username, active in changed if active],
+        "deactivated": [{"chat_id": chat_id, "username": username} for chat_id, username, active in changed if not active],
+    }, status_code=200)
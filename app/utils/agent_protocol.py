@@ -0,0 +1,100 @@
+import base64
+import json
+import zlib
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+
+try:
+    import zstandard
+except ImportError:  # zstd необязателен, без него агент шлет gzip
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен, без него агент шлет JSON
+    msgpack = None
+
+
+VERSION = 2
+
+
+@dataclass(frozen=True, slots=True)
+class AgentReport:
+    """
+    Отчет агента за один вход пользователя (протокол v2)
+
+    spec - характеристики ПК, thumbprints - отпечатки всех его сертификатов,
+    certs - DER только тех, которых сервер еще не знает (см. /parcer/v2/known).
+    """
+    spec: dict
+    thumbprints: list[str]
+    certs: list[bytes]
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """Тело запроса, но не больше max_bytes - иначе 413 без дочитывания"""
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise HTTPException(413, "Слишком большой запрос")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(413, "Слишком большой запрос")
+    return bytes(body)
+
+
+def decompress(body: bytes, encoding: str, max_bytes: int) -> bytes:
+    """Content-Encoding gzip / zstd / identity; распакованное тоже ограничено max_bytes"""
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return body
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(body, max_bytes)
+        except zlib.error as e:
+            raise HTTPException(400, f"Некорректный gzip: {e}")
+        if decompressor.unconsumed_tail:
+            raise HTTPException(413, "Распакованный отчет слишком большой")
+        if not decompressor.eof:
+            raise HTTPException(400, "Некорректный gzip: данные обрезаны")
+        return data
+    if encoding == "zstd" and zstandard is not None:
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                data = reader.read(max_bytes + 1)
+        except zstandard.ZstdError as e:
+            raise HTTPException(400, f"Некорректный zstd: {e}")
+        if len(data) > max_bytes:
+            raise HTTPException(413, "Распакованный отчет слишком большой")
+        return data
+    raise HTTPException(415, f"Content-Encoding {encoding} не поддерживается")
+
+
+def decode_report(body: bytes, content_type: str, content_encoding: str, max_bytes: int) -> AgentReport:
+    data = decompress(body, content_encoding, max_bytes)
+    content_type = content_type.split(";")[0].strip().lower()
+    try:
+        if content_type in ("application/msgpack", "application/x-msgpack"):
+            if msgpack is None:
+                raise HTTPException(415, "msgpack не поддерживается, отправьте JSON")
+            document = msgpack.unpackb(data, raw=False)
+            certs = document.get("certs") or []
+        else:
+            document = json.loads(data)
+            # В JSON файлы сертификатов передаются в base64
+            certs = [base64.b64decode(cert, validate=True) for cert in document.get("certs") or []]
+    except (ValueError, TypeError, AttributeError) as e:
+        raise HTTPException(400, f"Некорректный отчет: {e}")
+
+    if document.get("version") != VERSION:
+        raise HTTPException(400, f"Ожидается version: {VERSION}")
+    spec = document.get("spec") or {}
+    thumbprints = document.get("thumbprints") or []
+    if not isinstance(spec, dict) or not all(isinstance(item, str) for item in thumbprints) \
+            or not all(isinstance(cert, bytes) for cert in certs):
+        raise HTTPException(400, "Некорректный отчет: spec - объект, thumbprints - строки, certs - файлы")
+    # Windows отдает отпечаток в верхнем регистре, в БД - hex в нижнем
+    return AgentReport(spec=spec, thumbprints=sorted({item.strip().lower() for item in thumbprints}), certs=certs)
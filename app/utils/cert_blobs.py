@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import CertBlob
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def put_blobs(db: AsyncSession, blobs: dict[str, bytes]):
+    """
+    Сохранить файлы сертификатов {sha256: содержимое}
+
+    Одинаковое содержимое хранится один раз: повторная загрузка того же
+    файла с другого ПК упирается в первичный ключ и ничего не пишет.
+    """
+    blobs = {sha256: data for sha256, data in blobs.items() if data}
+    if blobs:
+        now = datetime.now(timezone.utc)
+        await db.execute(
+            pg_insert(CertBlob)
+            .values([{"sha256": sha256, "data": data, "size": len(data), "created_at": now}
+                     for sha256, data in blobs.items()])
+            .on_conflict_do_nothing(index_elements=[CertBlob.sha256])
+        )
+
+
+async def stream_blob(db: AsyncSession, sha256: str, size: int) -> AsyncIterator[bytes]:
+    """Файл кусками по CHUNK_SIZE: bytea целиком в память приложения не читается"""
+    for offset in range(0, size, CHUNK_SIZE):
+        # substring в Postgres считает с 1
+        yield await db.scalar(
+            select(func.substring(CertBlob.data, offset + 1, CHUNK_SIZE)).where(CertBlob.sha256 == sha256)
+        )
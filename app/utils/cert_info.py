@@ -1,21 +1,187 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
 from cryptography import x509
 from cryptography.hazmat._oid import NameOID
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 
+from app.config import get_settings
 
-async def get_subject(file):
-    cert_data = await file.read()
+
+settings = get_settings()
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedCert:
+    issuer: str
+    subject: str
+    surname: str
+    given_name: str
+    version: int
+    thumbprint: str
+    date_to: date
+    date_from: date
+
+    @property
+    def person_name(self) -> str:
+        return self.surname + " " + self.given_name
+
+
+def parse_cert(cert_data: bytes) -> ParsedCert:
+    """Разбор сертификата (PEM или DER) из уже прочитанных байт"""
     try:
         cert = x509.load_pem_x509_certificate(cert_data, default_backend())
     except ValueError:
         cert = x509.load_der_x509_certificate(cert_data, default_backend())
     #print(cert.fingerprint(hashes.SHA1()).hex())
-    return {"issuer": cert.issuer.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value,
-            "subject": cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value,
-            "surname": cert.subject.get_attributes_for_oid(NameOID.SURNAME)[0].value,
-            "given_name": cert.subject.get_attributes_for_oid(NameOID.GIVEN_NAME)[0].value,
-            "version": cert.version.value + 1,
-            "thumbprint": cert.fingerprint(hashes.SHA1()).hex(),
-            "date_to": cert.not_valid_after_utc.date(),
-            "date_from": cert.not_valid_before_utc.date()}
+    return ParsedCert(issuer=cert.issuer.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value,
+                      subject=cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value,
+                      surname=cert.subject.get_attributes_for_oid(NameOID.SURNAME)[0].value,
+                      given_name=cert.subject.get_attributes_for_oid(NameOID.GIVEN_NAME)[0].value,
+                      version=cert.version.value + 1,
+                      thumbprint=cert.fingerprint(hashes.SHA1()).hex(),
+                      date_to=cert.not_valid_after_utc.date(),
+                      date_from=cert.not_valid_before_utc.date())
+
+
+class ParsePoolBusy(Exception):
+    """Очередь разбора переполнена - клиенту стоит повторить позже"""
+
+
+class CertParsePool:
+    """
+    Разбор сертификатов вне event loop
+
+    Одновременно в пуле находится не больше workers + queue_size задач,
+    остальные ждут свободного места не дольше queue_timeout секунд.
+    """
+    def __init__(self, mode: str, workers: int, queue_size: int, queue_timeout: float):
+        self.mode = mode
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(workers + queue_size)
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cert-parse")
+        return self._executor
+
+    async def parse(self, cert_data: bytes) -> ParsedCert:
+        if self.mode == "inline":
+            return parse_cert(cert_data)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ParsePoolBusy()
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), parse_cert, cert_data)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "in_flight": self.in_flight,
+                "completed": self.completed, "rejected": self.rejected}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = CertParsePool(
+    mode=settings.CERT_PARSE_MODE,
+    workers=settings.CERT_PARSE_WORKERS,
+    queue_size=settings.CERT_PARSE_QUEUE_SIZE,
+    queue_timeout=settings.CERT_PARSE_QUEUE_TIMEOUT,
+)
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    parsed: ParsedCert
+    cert_id: Optional[int]
+    expires_at: float
+
+
+class ParsedCertCache:
+    """
+    LRU-кэш разобранных сертификатов по SHA-256 от исходных байт
+
+    Кроме результата разбора хранит cert_id уже сохраненного сертификата,
+    чтобы повторная загрузка того же файла не требовала поиска по thumbprint.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(cert_data: bytes) -> bytes:
+        return hashlib.sha256(cert_data).digest()
+
+    def get(self, key: bytes) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: bytes, parsed: ParsedCert, cert_id: Optional[int] = None) -> CacheEntry:
+        entry = self._entries[key] = CacheEntry(parsed, cert_id, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def discard_cert(self, cert_id: int):
+        """Сбросить cert_id удаленного сертификата (сам разбор остается валидным)"""
+        for entry in self._entries.values():
+            if entry.cert_id == cert_id:
+                entry.cert_id = None
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+cache = ParsedCertCache(maxsize=settings.CERT_CACHE_SIZE, ttl=settings.CERT_CACHE_TTL_SECONDS)
+
+
+async def parse_cached(cert_data: bytes, key: Optional[bytes] = None) -> CacheEntry:
+    """key - SHA-256 файла, если уже посчитан (uploads.UploadedFile.sha256)"""
+    key = key or cache.key(cert_data)
+    entry = cache.get(key)
+    if entry is None:
+        entry = cache.put(key, await pool.parse(cert_data))
+    return entry
+
+
+async def get_subject(file) -> ParsedCert:
+    cert_data = await file.read()
+    return (await parse_cached(cert_data)).parsed
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.models import Cert, CertAlert, Person, TelegramUser
+from app.utils import tg_outbox
+
+
+settings = get_settings()
+
+
+def alert_window(days_left: int, windows: list[int]) -> Optional[int]:
+    """Наименьшее окно, в которое уже попал сертификат (10 дней -> окно 14)"""
+    matching = [window for window in windows if days_left <= window]
+    return min(matching) if matching else None
+
+
+def format_alert(rows: list) -> str:
+    lines = ["⚠️ Истекают сертификаты:"]
+    for name, person, date_to, days_left in rows:
+        lines.append(f"• {name} ({person or '—'}) — до {date_to:%d.%m.%Y}, осталось {days_left} дн.")
+    return "\n".join(lines)
+
+
+async def scan_once(windows: list[int]) -> int:
+    """
+    Один проход: найти сертификаты в окнах уведомлений и разослать подписчикам
+
+    Читается только диапазон certs.date_to от сейчас до самого дальнего окна
+    (индекс по date_to), поэтому стоимость зависит от числа истекающих
+    сертификатов, а не от размера таблицы. Отправленные окна фиксируются в
+    cert_alerts вставкой с ON CONFLICT, так что повторный проход или второй
+    воркер не пришлет то же уведомление еще раз. Сообщения ставятся в
+    telegram_outbox в той же транзакции и уходят через OutboxWorker. Пока
+    подписчиков нет, окна не фиксируются: уведомление уйдет первому из них.
+    """
+    now = datetime.now()
+    today = now.date()
+    async with SessionLocal() as db:
+        chat_ids = (await db.scalars(select(TelegramUser.chat_id).where(TelegramUser.is_active))).all()
+        if not chat_ids:
+            return 0
+
+        expiring = (await db.execute(
+            select(Cert.cert_id, Cert.name, Person.name, Cert.date_to)
+            .outerjoin(Person, Person.person_id == Cert.person_id)
+            .where(Cert.date_to >= today, Cert.date_to < today + timedelta(days=max(windows) + 1))
+        )).all()
+
+        due = {}
+        for cert_id, name, person, date_to in expiring:
+            days_left = (date_to.date() - today).days
+            window = alert_window(days_left, windows)
+            if window is not None:
+                due[(cert_id, window)] = (name, person, date_to, days_left)
+        if not due:
+            return 0
+
+        sent = (await db.execute(
+            pg_insert(CertAlert)
+            .values([{"cert_id": cert_id, "window_days": window, "sent_at": now} for cert_id, window in due])
+            .on_conflict_do_nothing(index_elements=[CertAlert.cert_id, CertAlert.window_days])
+            .returning(CertAlert.cert_id, CertAlert.window_days)
+        )).all()
+        if sent:
+            text = format_alert(sorted((due[tuple(key)] for key in sent), key=lambda row: row[2]))
+            await tg_outbox.enqueue(db, chat_ids, text)
+        await db.commit()
+
+    if sent:
+        tg_outbox.worker.notify()
+    return len(sent)
+
+
+class ExpiryScheduler:
+    """Фоновая задача: scan_once раз в EXPIRY_SCAN_INTERVAL_SECONDS"""
+    def __init__(self, interval: float, windows: list[int]):
+        self.interval = interval
+        self.windows = sorted(windows)
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.last_sent = 0
+
+    async def _run(self):
+        while True:
+            try:
+                self.last_sent = await scan_once(self.windows)
+                self.last_run = datetime.now()
+            except Exception as e:
+                print(f"Ошибка проверки сроков сертификатов: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"last_run": self.last_run.isoformat() if self.last_run else None,
+                "last_sent": self.last_sent}
+
+
+scheduler = ExpiryScheduler(
+    interval=settings.EXPIRY_SCAN_INTERVAL_SECONDS,
+    windows=settings.EXPIRY_ALERT_WINDOWS,
+)
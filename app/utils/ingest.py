@@ -0,0 +1,252 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, delete, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Cert, Person, PC, PCSpecChange, cert_pc_association
+from app.utils import cert_blobs, cert_info, spec_check
+from app.utils.uploads import UploadedFile
+
+
+async def parse_uploads(uploads: list[UploadedFile]) -> tuple[list[dict], dict]:
+    """
+    Разбор загруженных файлов до обращения к БД (кэш по SHA-256, затем пул)
+
+    Возвращает результаты по файлам и {thumbprint: (CacheEntry, UploadedFile)}.
+    Переполненный пул - cert_info.ParsePoolBusy.
+    """
+    entries = await asyncio.gather(
+        *(cert_info.parse_cached(upload.data, upload.sha256) for upload in uploads), return_exceptions=True
+    )
+
+    results = []
+    parsed = {}
+    for upload, entry in zip(uploads, entries):
+        if isinstance(entry, (ValueError, IndexError)):
+            results.append({"file": upload.filename, "status": "error", "detail": str(entry)})
+            continue
+        if isinstance(entry, BaseException):
+            raise entry
+        parsed.setdefault(entry.parsed.thumbprint, (entry, upload))
+        results.append({"file": upload.filename, "thumbprint": entry.parsed.thumbprint})
+    return results, parsed
+
+
+async def upsert_pc(db: AsyncSession, domain_name: str, user: str) -> int:
+    """ПК: вставка с ON CONFLICT DO NOTHING, существующий читается без записи и блокировки строки"""
+    pc_id = await db.scalar(
+        pg_insert(PC)
+        .values(domain_name=domain_name, name=user)
+        .on_conflict_do_nothing(index_elements=[PC.domain_name])
+        .returning(PC.pc_id)
+    )
+    if pc_id is None:
+        pc_id = await db.scalar(select(PC.pc_id).where(PC.domain_name == domain_name))
+    return pc_id
+
+
+async def save_certs(db: AsyncSession, parsed: dict) -> tuple[dict, set]:
+    """
+    Сертификаты из кэша уже знают свой cert_id, остальные - upsert одним запросом
+
+    Вставка идет с ON CONFLICT DO NOTHING: существующие строки persons и
+    certs не переписываются и не блокируются, их id дочитываются одним
+    SELECT. Возвращает {thumbprint: cert_id} и множество только что
+    созданных thumbprint.
+    """
+    cert_ids = {thumbprint: entry.cert_id for thumbprint, (entry, _) in parsed.items() if entry.cert_id}
+    upsert = [item for thumbprint, item in parsed.items() if thumbprint not in cert_ids]
+    created = set()
+    if not upsert:
+        return cert_ids, created
+
+    await cert_blobs.put_blobs(db, {upload.sha256.hex(): upload.data for _, upload in upsert})
+    names = {entry.parsed.person_name for entry, _ in upsert}
+    person_ids = dict((await db.execute(
+        pg_insert(Person).values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=[Person.name])
+        .returning(Person.name, Person.person_id)
+    )).all())
+    if len(person_ids) < len(names):
+        person_ids.update((await db.execute(
+            select(Person.name, Person.person_id).where(Person.name.in_(list(names - person_ids.keys())))
+        )).all())
+
+    stmt = pg_insert(Cert).values(
+        [{"name": entry.parsed.subject,
+          "date_from": entry.parsed.date_from,
+          "date_to": entry.parsed.date_to,
+          "thumbprint": entry.parsed.thumbprint,
+          "org": entry.parsed.issuer,
+          "blob_sha256": upload.sha256.hex(),
+          "person_id": person_ids[entry.parsed.person_name]}
+         for entry, upload in upsert]
+    )
+    rows = await db.execute(
+        stmt.on_conflict_do_nothing(index_elements=[Cert.thumbprint]).returning(Cert.thumbprint, Cert.cert_id)
+    )
+    for thumbprint, cert_id in rows:
+        cert_ids[thumbprint] = cert_id
+        created.add(thumbprint)
+
+    existing = {entry.parsed.thumbprint: upload for entry, upload in upsert if entry.parsed.thumbprint not in created}
+    if not existing:
+        return cert_ids, created
+    without_blob = []
+    for thumbprint, cert_id, blob_sha256 in await db.execute(
+        select(Cert.thumbprint, Cert.cert_id, Cert.blob_sha256).where(Cert.thumbprint.in_(list(existing)))
+    ):
+        cert_ids[thumbprint] = cert_id
+        if blob_sha256 is None:
+            without_blob.append({"id": cert_id, "blob": existing[thumbprint].sha256.hex()})
+    if without_blob:
+        # Существующему сертификату без файла (заведен вручную) файл дописывается
+        certs = Cert.__table__
+        await db.execute(
+            update(certs)
+            .where(certs.c.cert_id == bindparam("id"), certs.c.blob_sha256.is_(None))
+            .values(blob_sha256=bindparam("blob")),
+            without_blob,
+        )
+    return cert_ids, created
+
+
+def remember_cert_ids(parsed: dict, cert_ids: dict):
+    """После коммита: следующий отчет с теми же файлами обойдется без upsert"""
+    for thumbprint, (entry, _) in parsed.items():
+        entry.cert_id = cert_ids.get(thumbprint)
+
+
+async def link_certs(db: AsyncSession, pc_id: int, cert_ids: Iterable[int] = (),
+                     thumbprints: Iterable[str] = ()) -> tuple[set, int]:
+    """
+    Связи cert_pc одним запросом: (найденные cert_id, число новых связей)
+
+    Как и раньше, сертификат числится за ПК, который его прислал: связи с
+    другими ПК удаляются. cert_id из кэша, которого уже нет в certs, в
+    найденные не попадает.
+    """
+    cert_ids, thumbprints = list(cert_ids), list(thumbprints)
+    if not cert_ids and not thumbprints:
+        return set(), 0
+    condition = Cert.cert_id.in_(cert_ids) if cert_ids else Cert.thumbprint.in_(thumbprints)
+    if cert_ids and thumbprints:
+        condition = condition | Cert.thumbprint.in_(thumbprints)
+    matched = select(Cert.cert_id).where(condition).cte("matched")
+    moved = delete(cert_pc_association).where(
+        cert_pc_association.c.cert_id.in_(select(matched.c.cert_id)),
+        cert_pc_association.c.pc_id != pc_id,
+    ).cte("moved")
+    linked = pg_insert(cert_pc_association).from_select(
+        ["pc_id", "cert_id"],
+        select(literal(pc_id), matched.c.cert_id),
+    ).on_conflict_do_nothing().returning(cert_pc_association.c.cert_id).cte("linked")
+    # Уже существующие связи ON CONFLICT не возвращает, поэтому найденные - из matched
+    rows = (await db.execute(
+        select(matched.c.cert_id, linked.c.cert_id.is_not(None))
+        .select_from(matched.outerjoin(linked, linked.c.cert_id == matched.c.cert_id))
+        .add_cte(moved)
+    )).all()
+    return {cert_id for cert_id, _ in rows}, sum(1 for _, new in rows if new)
+
+
+async def relink_stale(db: AsyncSession, pc_id: int, parsed: dict, cert_ids: dict, created: set,
+                       stale_ids: set) -> int:
+    """
+    cert_id из кэша не нашлись в certs: сертификат удалили в другом воркере,
+    а сбросился только его кэш. Такие сертификаты создаются заново upsert'ом
+    и привязываются; cert_ids и created дополняются.
+    """
+    stale = {thumbprint: item for thumbprint, item in parsed.items() if cert_ids.get(thumbprint) in stale_ids}
+    for entry, _ in stale.values():
+        entry.cert_id = None
+    ids, new = await save_certs(db, stale)
+    cert_ids.update(ids)
+    created |= new
+    _, linked = await link_certs(db, pc_id, cert_ids=ids.values())
+    return linked
+
+
+async def stored_thumbprints(db: AsyncSession, thumbprints: Iterable[str]) -> set:
+    """Отпечатки сертификатов, которые уже есть в БД вместе с файлом"""
+    return set((await db.scalars(
+        select(Cert.thumbprint).where(Cert.thumbprint.in_(list(thumbprints)), Cert.blob_sha256.is_not(None))
+    )).all())
+
+
+async def save_spec(db: AsyncSession, domain_name: str, user: str, data: dict) -> tuple[Optional[int], str]:
+    """
+    Характеристики ПК, без коммита: (pc_id, created | unchanged | changed)
+
+    Частый случай - железо не менялось: один UPDATE без чтения spec.
+    """
+    digest = spec_check.spec_hash(data)
+    now = datetime.now(timezone.utc)
+
+    pc_id = await db.scalar(
+        update(PC)
+        .where(PC.domain_name == domain_name, PC.spec_hash == digest)
+        .values(timestamp=now)
+        .returning(PC.pc_id)
+    )
+    if pc_id is not None:
+        spec_check.spec_metrics.unchanged += 1
+        return pc_id, "unchanged"
+
+    # Новый ПК создается одной вставкой, гонка двух отчетов решается уникальным индексом
+    pc_id = await db.scalar(
+        pg_insert(PC)
+        .values(domain_name=domain_name, name=user, spec=data, spec_hash=digest,
+                timestamp=now)
+        .on_conflict_do_nothing(index_elements=[PC.domain_name])
+        .returning(PC.pc_id)
+    )
+    if pc_id is not None:
+        spec_check.spec_metrics.created += 1
+        return pc_id, "created"
+
+    pc = (await db.scalars(select(PC).where(PC.domain_name == domain_name).with_for_update())).one()
+    # История дописывается отдельными строками, сама строка pcs не растет
+    history = spec_check.compare(pc.spec or {}, data)
+    if history:
+        await db.execute(insert(PCSpecChange), [
+            {"pc_id": pc.pc_id, "timestamp": now, **change} for change in history
+        ])
+    pc.spec = data
+    pc.spec_hash = digest
+    pc.timestamp = now
+    spec_check.spec_metrics.changed += 1
+    return pc.pc_id, "changed"
+
+
+async def apply_reports(db: AsyncSession, reports: list) -> tuple[list[dict], set]:
+    """
+    Применить отчеты агентов (ingest_queue.PendingReport) одной транзакцией
+
+    Сертификаты всех отчетов сохраняются одним upsert, затем по каждому ПК -
+    характеристики и связи. ПК и сертификаты обрабатываются в порядке ключей,
+    чтобы параллельные пачки брали блокировки строк в одном порядке.
+    """
+    parsed = {}
+    for report in reports:
+        parsed.update(report.parsed)
+    cert_ids, created = await save_certs(db, dict(sorted(parsed.items())))
+
+    results = []
+    for report in sorted(reports, key=lambda item: item.domain_name):
+        if report.spec is not None:
+            pc_id, spec_status = await save_spec(db, report.domain_name, report.user, report.spec)
+        else:
+            pc_id, spec_status = await upsert_pc(db, report.domain_name, report.user), None
+        ids = [cert_ids[thumbprint] for thumbprint in report.parsed if thumbprint in cert_ids]
+        matched, linked = await link_certs(db, pc_id, cert_ids=ids,
+                                           thumbprints=sorted(report.thumbprints - report.parsed.keys()))
+        if not matched.issuperset(ids):
+            linked += await relink_stale(db, pc_id, report.parsed, cert_ids, created, set(ids) - matched)
+        results.append({"domain_name": report.domain_name, "pc_id": pc_id, "spec": spec_status, "linked": linked})
+    await db.commit()
+    remember_cert_ids(parsed, cert_ids)
+    return results, created
@@ -0,0 +1,358 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import asyncpg
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.utils import ingest
+from app.utils.uploads import UploadedFile
+
+try:
+    import fcntl
+except ImportError:  # Windows: журнал без блокировки, один процесс на каталог
+    fcntl = None
+
+
+settings = get_settings()
+
+
+# Связь с БД потеряна (перезапуск Postgres, сеть, пул): отчеты тут ни при чем
+CONNECTION_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, OSError,
+                     asyncpg.exceptions.PostgresConnectionError, asyncpg.exceptions.OperatorInterventionError)
+
+
+def connection_lost(error: Exception) -> bool:
+    return isinstance(error, CONNECTION_ERRORS) or getattr(error, "connection_invalidated", False)
+
+
+class IngestQueueFull(Exception):
+    """В очереди INGEST_QUEUE_SIZE ПК или INGEST_QUEUE_MAX_BYTES данных, новый отчет принять некуда"""
+
+
+@dataclass(slots=True)
+class PendingReport:
+    """
+    Отчет агента, ожидающий записи в БД
+
+    Отчеты одного ПК сливаются: характеристики - последние, сертификаты и
+    отпечатки - объединение. parsed - {thumbprint: (CacheEntry, UploadedFile)}.
+    """
+    domain_name: str
+    user: str
+    spec: Optional[dict] = None
+    thumbprints: set = field(default_factory=set)
+    parsed: dict = field(default_factory=dict)
+    received_at: float = field(default_factory=time.monotonic)
+    reports: int = 1
+    attempts: int = 0
+    nbytes: int = field(init=False, default=0)
+
+    def __post_init__(self):
+        self.nbytes = self._measure()
+
+    def _measure(self) -> int:
+        # Сколько отчет держит в памяти: файлы сертификатов и характеристики
+        spec = len(json.dumps(self.spec, ensure_ascii=False)) if self.spec is not None else 0
+        return spec + sum(len(upload.data) for _, upload in self.parsed.values())
+
+    def merge(self, newer: "PendingReport"):
+        self.user = newer.user
+        if newer.spec is not None:
+            self.spec = newer.spec
+        self.thumbprints |= newer.thumbprints
+        self.parsed.update(newer.parsed)
+        self.reports += newer.reports
+        self.nbytes = self._measure()
+
+    def to_journal(self) -> bytes:
+        return json.dumps({
+            "domain_name": self.domain_name,
+            "user": self.user,
+            "spec": self.spec,
+            "thumbprints": sorted(self.thumbprints),
+            "certs": [base64.b64encode(upload.data).decode() for _, upload in self.parsed.values()],
+        }, ensure_ascii=False).encode() + b"\n"
+
+
+async def prepare_report(domain_name: str, user: str, spec: Optional[dict] = None,
+                         thumbprints=(), uploads: list[UploadedFile] = ()) -> tuple[list[dict], PendingReport]:
+    """Разбор сертификатов отчета до постановки в очередь; ParsePoolBusy - как в ingest.parse_uploads"""
+    results, parsed = await ingest.parse_uploads(list(uploads))
+    return results, PendingReport(domain_name, user, spec, set(thumbprints), parsed)
+
+
+class _Journal:
+    """
+    Журнал очереди: JSON-строка на каждый принятый отчет
+
+    У каждого процесса свой файл, занятый flock. Файл без блокировки остался
+    от упавшего процесса - его отчеты заново ставятся в очередь при старте.
+    Повторная запись отчета безвредна: все операции ingest идемпотентны.
+    """
+    def __init__(self, directory: str, fsync: bool):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self.path = os.path.join(directory, f"ingest-{os.getpid()}-{time.time_ns()}.jsonl")
+        self._file = open(self.path, "ab")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _write(self, record: bytes):
+        self._file.write(record)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    async def append(self, record: bytes):
+        if self.fsync:
+            await asyncio.to_thread(self._write, record)
+        else:
+            self._write(record)
+
+    def truncate(self):
+        self._file.truncate(0)
+
+    def orphans(self):
+        """Журналы завершившихся процессов: (путь, открытый файл под блокировкой)"""
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not (name.startswith("ingest-") and name.endswith(".jsonl")) or path == self.path:
+                continue
+            file = open(path, "rb")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:  # журнал живого воркера
+                    file.close()
+                    continue
+            yield path, file
+
+    def close(self, keep: bool):
+        self._file.close()
+        if not keep:
+            os.remove(self.path)
+
+
+class IngestQueue:
+    """
+    Отложенная запись отчетов агентов (write-behind)
+
+    Обработчики /parcer только разбирают отчет и кладут его сюда, ответ 202
+    уходит без обращения к БД. Очередь - словарь по domain_name: повторный
+    отчет того же ПК сливается с ожидающим и не занимает места. Фоновая задача
+    выжидает INGEST_BATCH_LINGER_SECONDS, берет до INGEST_BATCH_SIZE ПК и пишет
+    их одной транзакцией (ingest.apply_reports). Если пачка не записалась,
+    отчеты пишутся по одному, неудавшиеся возвращаются в очередь до
+    INGEST_MAX_ATTEMPTS попыток. Попытки тратят только ошибки в данных
+    отчета: при потере связи с БД пачка целиком ждет INGEST_RETRY_SECONDS и
+    повторяется, сколько бы БД ни была недоступна (новые отчеты тем временем
+    упираются в INGEST_QUEUE_SIZE и INGEST_QUEUE_MAX_BYTES).
+    """
+    def __init__(self, max_size: int, max_bytes: int, batch_size: int, linger: float, retry_seconds: float,
+                 max_attempts: int, journal_dir: Optional[str] = None, journal_fsync: bool = False):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.linger = linger
+        self.retry_seconds = retry_seconds
+        self.max_attempts = max_attempts
+        self.journal_dir = journal_dir
+        self.journal_fsync = journal_fsync
+        self._journal: Optional[_Journal] = None
+        self._keep_journal = False
+        self._pending: dict[str, PendingReport] = {}
+        self._bytes = 0
+        self._ready = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.recovered = 0
+        self.batches = 0
+        self.applied = 0
+        self.retried = 0
+        self.deferred = 0
+        self.failed = 0
+        self.apply_total = 0.0
+        self.apply_max = 0.0
+        self.lag_max = 0.0
+
+    async def put(self, report: PendingReport):
+        """Принять отчет; IngestQueueFull, если новый ПК или данные отчета не помещаются"""
+        pending = self._pending.get(report.domain_name)
+        if (pending is None and len(self._pending) >= self.max_size) or self._bytes + report.nbytes > self.max_bytes:
+            self.rejected += 1
+            raise IngestQueueFull()
+        # Сначала в очередь, потом в журнал: журнал очищается только при пустой очереди
+        if pending is None:
+            self._pending[report.domain_name] = report
+            self._bytes += report.nbytes
+        else:
+            self._bytes -= pending.nbytes
+            pending.merge(report)
+            self._bytes += pending.nbytes
+            self.coalesced += 1
+        self.received += 1
+        self._ready.set()
+        if self._journal is not None:
+            await self._journal.append(report.to_journal())
+
+    def _take(self) -> list[PendingReport]:
+        keys = list(itertools.islice(self._pending, self.batch_size))
+        batch = [self._pending.pop(key) for key in keys]
+        self._bytes -= sum(report.nbytes for report in batch)
+        return batch
+
+    def _requeue(self, report: PendingReport):
+        # Пришедший за время записи отчет новее: его характеристики остаются
+        newer = self._pending.pop(report.domain_name, None)
+        if newer is not None:
+            self._bytes -= newer.nbytes
+            report.merge(newer)
+        self._pending[report.domain_name] = report
+        self._bytes += report.nbytes
+
+    async def _write(self, reports: list[PendingReport]):
+        async with SessionLocal() as db:
+            await ingest.apply_reports(db, reports)
+
+    async def _apply(self, batch: list[PendingReport]) -> bool:
+        start = time.perf_counter()
+        written = list(batch)
+        try:
+            await self._write(batch)
+        except Exception as e:
+            if connection_lost(e) and not self._closing:
+                print(f"Нет связи с БД, пачка отчетов отложена: {e}")
+                self.deferred += len(batch)
+                for report in batch:
+                    self._requeue(report)
+                return False
+            print(f"Ошибка записи пачки отчетов, запись по одному: {e}")
+            for report in batch:
+                try:
+                    await self._write([report])
+                except Exception as e:
+                    written.remove(report)
+                    if connection_lost(e) and not self._closing:
+                        self.deferred += 1
+                        self._requeue(report)
+                        continue
+                    report.attempts += 1
+                    if self._closing:
+                        # Отчет остается в журнале до следующего запуска
+                        self._keep_journal = True
+                    elif report.attempts < self.max_attempts:
+                        self.retried += 1
+                        self._requeue(report)
+                        continue
+                    self.failed += 1
+                    print(f"Отчет {report.domain_name} не записан: {e}")
+
+        elapsed = time.perf_counter() - start
+        now = time.monotonic()
+        self.batches += 1
+        self.applied += len(written)
+        self.apply_total += elapsed
+        self.apply_max = max(self.apply_max, elapsed)
+        self.lag_max = max([self.lag_max] + [now - report.received_at for report in written])
+        return len(written) == len(batch)
+
+    async def _recover(self):
+        for path, file in self._journal.orphans():
+            with file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:  # недописанная строка при падении
+                        continue
+                    certs = [base64.b64decode(cert) for cert in record["certs"]]
+                    uploads = [UploadedFile(f"cert{n}.cer", data, hashlib.sha256(data).digest())
+                               for n, data in enumerate(certs)]
+                    _, report = await prepare_report(record["domain_name"], record["user"], record["spec"],
+                                                     record["thumbprints"], uploads)
+                    await self.put(report)
+                    self.recovered += 1
+            os.remove(path)
+
+    async def _run(self):
+        if self._journal is not None:
+            try:
+                await self._recover()
+            except Exception as e:
+                print(f"Ошибка восстановления журнала очереди отчетов: {e}")
+        while self._pending or not self._closing:
+            await self._ready.wait()
+            if not self._closing:
+                # Пауза перед пачкой: за нее повторные отчеты тех же ПК сливаются
+                await asyncio.sleep(self.linger)
+            batch = self._take()
+            if batch and not await self._apply(batch) and not self._closing:
+                await asyncio.sleep(self.retry_seconds)
+            if not self._pending:
+                self._ready.clear()
+                if self._journal is not None and not self._keep_journal:
+                    self._journal.truncate()
+
+    def start(self):
+        if self._task is None:
+            if self.journal_dir:
+                self._journal = _Journal(self.journal_dir, self.journal_fsync)
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописать очередь в БД и остановиться; журнал удаляется, если все записано"""
+        if self._task is not None:
+            self._closing = True
+            self._ready.set()
+            await self._task
+            self._task = None
+        if self._journal is not None:
+            self._journal.close(keep=self._keep_journal or bool(self._pending))
+            self._journal = None
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._pending),
+            "max_size": self.max_size,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "coalesce_ratio": self.coalesced / self.received if self.received else 0.0,
+            "rejected": self.rejected,
+            "recovered": self.recovered,
+            "batches": self.batches,
+            "applied": self.applied,
+            "retried": self.retried,
+            "deferred": self.deferred,
+            "failed": self.failed,
+            "apply_avg_ms": self.apply_total / self.batches * 1000 if self.batches else 0.0,
+            "apply_max_ms": self.apply_max * 1000,
+            "lag_max_ms": self.lag_max * 1000,
+            "journal": self._journal.path if self._journal is not None else None,
+        }
+
+
+queue = IngestQueue(
+    max_size=settings.INGEST_QUEUE_SIZE,
+    max_bytes=settings.INGEST_QUEUE_MAX_BYTES,
+    batch_size=settings.INGEST_BATCH_SIZE,
+    linger=settings.INGEST_BATCH_LINGER_SECONDS,
+    retry_seconds=settings.INGEST_RETRY_SECONDS,
+    max_attempts=settings.INGEST_MAX_ATTEMPTS,
+    journal_dir=settings.INGEST_JOURNAL_DIR,
+    journal_fsync=settings.INGEST_JOURNAL_FSYNC,
+)
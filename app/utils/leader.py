@@ -0,0 +1,107 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import get_settings
+from app.database import engine
+
+
+settings = get_settings()
+
+# Ключ advisory lock, общий для всех воркеров: "cert"
+LOCK_KEY = 0x63657274
+
+
+class LeaderElection:
+    """
+    Фоновые задачи, которые должны идти в одном воркере из нескольких
+
+    Воркер, взявший pg_try_advisory_lock, запускает задачи (long polling
+    Telegram отвечает 409 второму процессу, проверку сроков нет смысла
+    делать N раз, а очередь отправки из N процессов превысила бы лимиты
+    Bot API в N раз). Блокировка живет, пока открыто ее соединение, поэтому
+    оно держится отдельно от пула запросов. Если лидер завершился (в том
+    числе при плановом перезапуске воркера), блокировку через
+    LEADER_RETRY_SECONDS заберет другой воркер.
+    """
+    def __init__(self, key: int, retry_seconds: float):
+        self.key = key
+        self.retry_seconds = retry_seconds
+        self._tasks: list = []
+        self._conn: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self.acquired_at: Optional[datetime] = None
+        self.errors = 0
+
+    def add(self, task):
+        """Объект с start() и async stop(), как ExpiryScheduler, UpdatesPoller и OutboxWorker"""
+        self._tasks.append(task)
+
+    async def _try_acquire(self):
+        conn = await engine.connect()
+        try:
+            locked = await conn.scalar(select(func.pg_try_advisory_lock(self.key)))
+            # Блокировка уровня сессии переживает коммит, соединение не висит в транзакции
+            await conn.commit()
+        except BaseException:
+            await conn.invalidate()
+            await conn.close()
+            raise
+        if not locked:
+            await conn.close()
+            return
+        self._conn = conn
+        self.acquired_at = datetime.now()
+        for task in self._tasks:
+            task.start()
+
+    async def _release(self):
+        for task in self._tasks:
+            await task.stop()
+        if self._conn is not None:
+            # Закрытие DBAPI-соединения снимает блокировку; в пул оно не возвращается
+            await self._conn.invalidate()
+            await self._conn.close()
+            self._conn = None
+        self.acquired_at = None
+
+    async def _run(self):
+        while True:
+            try:
+                if self._conn is None:
+                    await self._try_acquire()
+                else:
+                    # Соединение с блокировкой еще живо
+                    await self._conn.scalar(select(1))
+                    await self._conn.commit()
+            except Exception as e:
+                self.errors += 1
+                print(f"Ошибка блокировки фоновых задач: {e}")
+                await self._release()
+            await asyncio.sleep(self.retry_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._release()
+
+    def stats(self) -> dict:
+        return {"leader": self._conn is not None, "pid": os.getpid(),
+                "acquired_at": self.acquired_at.isoformat() if self.acquired_at else None,
+                "errors": self.errors}
+
+
+leader = LeaderElection(LOCK_KEY, settings.LEADER_RETRY_SECONDS)
@@ -0,0 +1,82 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request
+from sqlalchemy import DateTime, Date, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: Optional[str]
+
+
+def encode_cursor(value: Any, pk: int) -> str:
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    raw = json.dumps([value, pk]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_col) -> tuple[Any, int]:
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if value is not None and isinstance(sort_col.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(sort_col.type, Date):
+            value = date.fromisoformat(value)
+        return value, int(pk)
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Некорректный cursor")
+
+
+async def paginate(db: AsyncSession, stmt, sort_col, pk_col, limit: int,
+                   cursor: Optional[str] = None, desc: bool = False) -> Page:
+    """
+    Keyset-пагинация по (sort_col, pk_col)
+
+    Вместо OFFSET следующая страница начинается сразу после последней строки
+    предыдущей, поэтому стоимость запроса не растет с номером страницы.
+    Строки с NULL в sort_col идут в конце отдельной фазой: сначала строки со
+    значением (чистое сравнение кортежей - граница индекса (sort_col, pk), для
+    desc - обратный проход того же индекса), затем NULL по pk.
+    """
+    value, last_pk = decode_cursor(cursor, sort_col) if cursor else (None, None)
+    items = []
+
+    if not cursor or value is not None:
+        values = stmt.where(sort_col.is_not(None))
+        if cursor:
+            after = tuple_(sort_col, pk_col) < (value, last_pk) if desc else tuple_(sort_col, pk_col) > (value, last_pk)
+            values = values.where(after)
+        values = values.order_by(sort_col.desc(), pk_col.desc()) if desc else values.order_by(sort_col, pk_col)
+        items = list((await db.scalars(values.limit(limit + 1))).all())
+        last_pk = None
+
+    if len(items) <= limit:
+        nulls = stmt.where(sort_col.is_(None))
+        if last_pk is not None:
+            nulls = nulls.where(pk_col < last_pk if desc else pk_col > last_pk)
+        nulls = nulls.order_by(pk_col.desc() if desc else pk_col)
+        items += (await db.scalars(nulls.limit(limit + 1 - len(items)))).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_col.key), getattr(last, pk_col.key))
+    return Page(items=items, next_cursor=next_cursor)
+
+
+def next_page_url(request: Request, page: Page, path: Optional[str] = None) -> Optional[str]:
+    """Ссылка на следующую страницу с теми же фильтрами (path - если отдает другой маршрут)"""
+    if page.next_cursor is None:
+        return None
+    params = dict(request.query_params)
+    params["cursor"] = page.next_cursor
+    return f"{path or request.url.path}?{urlencode(params)}"
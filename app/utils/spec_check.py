@@ -1,16 +1,102 @@
-from datetime import datetime
+import hashlib
+import json
+
+
+COMPONENTS = ("motherboard", "cpu", "gpu", "ram", "storage")
+# Поля, по которым элементы списков (диски, видеокарты) сопоставляются между отчетами
+LIST_KEYS = ("serial", "name")
+
+
+def _list_key(old: list, new: list):
+    """Поле, уникальное для всех элементов обоих списков, или None - тогда по индексу"""
+    for key in LIST_KEYS:
+        if all(_unique_by(items, key) for items in (old, new)):
+            return key
+    return None
+
+
+def _unique_by(items: list, key: str) -> bool:
+    if not all(isinstance(item, dict) and isinstance(item.get(key), (str, int)) and item[key] != "" for item in items):
+        return False
+    values = [item[key] for item in items]
+    return len(set(values)) == len(values)
+
+
+def diff(old, new, path: str = "") -> list:
+    """
+    Минимальный набор изменений между двумя JSON-документами
+
+    Возвращает [{"path", "old", "new"}], где path - до самого глубокого
+    изменившегося значения: ram.modules[1].speed, storage[serial=S1].sizeGB.
+    Отсутствующий ключ - None с соответствующей стороны. Если агент прислал
+    один элемент объектом, а не списком (ConvertTo-Json так делает), он
+    сравнивается как список из одного элемента.
+    """
+    # Равные поддеревья сравниваются на уровне C и дальше не разбираются
+    if type(old) is type(new) and old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, list):
+        old = [old]
+    elif isinstance(old, list) and isinstance(new, dict):
+        new = [new]
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in sorted(old.keys() | new.keys()):
+            changes.extend(diff(old.get(key), new.get(key), f"{path}.{key}" if path else key))
+        return changes
+
+    if isinstance(old, list) and isinstance(new, list):
+        key = _list_key(old, new)
+        if key is None:
+            changes = []
+            for index in range(max(len(old), len(new))):
+                changes.extend(diff(old[index] if index < len(old) else None,
+                                    new[index] if index < len(new) else None,
+                                    f"{path}[{index}]"))
+            return changes
+        old_items = {item[key]: item for item in old}
+        new_items = {item[key]: item for item in new}
+        changes = []
+        for value in list(old_items) + [value for value in new_items if value not in old_items]:
+            changes.extend(diff(old_items.get(value), new_items.get(value), f"{path}[{key}={value}]"))
+        return changes
+
+    # Сюда доходят только различающиеся значения (True == 1, но тип другой)
+    return [{"path": path, "old": old, "new": new}]
 
 
 def compare(old_pc, new_pc):
+    """Изменения железа: [{"component", "path", "old", "new"}], лишние поля отчета не сравниваются"""
     history = []
-    if new_pc["motherboard"] != old_pc["motherboard"]:
-        history.append({"date": datetime.now().strftime('%d-%m-%Y %H:%M:%S'), "old": old_pc["motherboard"], "new": new_pc["motherboard"]})
-    if new_pc["cpu"] != old_pc["cpu"]:
-        history.append({"date": datetime.now().strftime('%d-%m-%Y %H:%M:%S'), "old": old_pc["cpu"], "new": new_pc["cpu"]})
-    if new_pc["gpu"] != old_pc["gpu"]:
-        history.append({"date": datetime.now().strftime('%d-%m-%Y %H:%M:%S'), "old": old_pc["gpu"], "new": new_pc["gpu"]})
-    if new_pc["ram"] != old_pc["ram"]:
-        history.append({"date": datetime.now().strftime('%d-%m-%Y %H:%M:%S'), "old": old_pc["ram"], "new": new_pc["ram"]})
-    if new_pc["storage"] != old_pc["storage"]:
-        history.append({"date": datetime.now().strftime('%d-%m-%Y %H:%M:%S'), "old": old_pc["storage"], "new": new_pc["storage"]})
-    return history
\ No newline at end of file
+    for component in COMPONENTS:
+        for change in diff(old_pc.get(component), new_pc.get(component), component):
+            history.append({"component": component, **change})
+    return history
+
+
+def spec_hash(spec: dict) -> str:
+    """
+    SHA-256 канонического JSON только по компонентам железа
+
+    timestamp, computer и user из отчета агента в хэш не входят, поэтому
+    повторный отчет с тем же железом дает тот же хэш.
+    """
+    hardware = {component: spec.get(component) for component in COMPONENTS}
+    canonical = json.dumps(hardware, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SpecMetrics:
+    """Отчеты агентов: сколько пропущено без изменений, сколько изменили характеристики"""
+    def __init__(self):
+        self.created = 0
+        self.unchanged = 0
+        self.changed = 0
+
+    def stats(self) -> dict:
+        return {"created": self.created, "unchanged": self.unchanged, "changed": self.changed}
+
+
+spec_metrics = SpecMetrics()
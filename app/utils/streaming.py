@@ -0,0 +1,31 @@
+from typing import AsyncIterator
+
+import jinja2
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Отдельное async-окружение: шаблон может итерироваться по серверному курсору
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("app/templates"),
+    autoescape=True,
+    enable_async=True,
+)
+
+
+async def stream_rows(db: AsyncSession, stmt, batch: int = 500) -> AsyncIterator:
+    """Строки запроса порциями по batch через серверный курсор, без загрузки всей таблицы"""
+    result = await db.stream_scalars(stmt.execution_options(yield_per=batch))
+    async for row in result:
+        yield row
+
+
+def stream_template(name: str, context: dict) -> StreamingResponse:
+    """
+    Потоковый рендер шаблона
+
+    HTML отдается клиенту по мере рендера, поэтому первый байт приходит сразу,
+    а в памяти воркера одновременно находится только текущая порция строк.
+    """
+    template = env.get_template(name)
+    return StreamingResponse(template.generate_async(**context), media_type="text/html; charset=utf-8")
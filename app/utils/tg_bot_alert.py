@@ -1,97 +1,209 @@
-import requests
+import asyncio
 import time
 from typing import List, Dict, Optional, Union
 
+import httpx
+
 from app.config import get_settings
 
 
 settings = get_settings()
 
 
+class TelegramError(Exception):
+    """
+    Ошибка вызова Bot API
+
+    retry_after - сколько секунд Telegram просит подождать (ответ 429),
+    permanent - повтор не поможет (чат не найден, бот заблокирован).
+    """
+    def __init__(self, description: str, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(description)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def wait(self):
+        """Дождаться токена, не забирая его"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def acquire(self):
+        while not self.try_take():
+            await self.wait()
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block(self, seconds: float):
+        """Ответ 429: не выдавать токены следующие seconds секунд"""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """
+    Лимиты Telegram на отправку: общий на бота и отдельный на каждый чат
+
+    По документации Bot API - около 30 сообщений в секунду всего и не чаще
+    одного сообщения в секунду в один чат.
+    """
+    MAX_IDLE_CHATS = 10000
+
+    def __init__(self, global_rate: float, chat_rate: float):
+        self.chat_rate = chat_rate
+        # Без запаса на всплеск: сообщения идут ровно, а не пачкой в начале секунды
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.waited = 0.0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.MAX_IDLE_CHATS:
+                # Полные ведра ничего не помнят - их можно выбросить
+                self.chat_buckets = {key: b for key, b in self.chat_buckets.items() if not b.idle()}
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    async def acquire(self, chat_id: int):
+        # Оба токена забираются в один момент, без await между ними: иначе
+        # сообщение, долго ждавшее общий токен, уходит почти одновременно со
+        # следующим сообщением в тот же чат
+        start = time.perf_counter()
+        chat = self._chat_bucket(chat_id)
+        while True:
+            await chat.wait()
+            await self.global_bucket.acquire()
+            if chat.try_take():
+                break
+            # Токен чата за это время забрало другое сообщение - общий возвращаем
+            self.global_bucket.refund()
+        self.waited += time.perf_counter() - start
+
+    def block(self, chat_id: int, seconds: float):
+        self._chat_bucket(chat_id).block(seconds)
+
+
 class TelegramBot:
-    def __init__(self):
-        self.token = settings.TG_TOKEN
-        self.base_url = f"https://api.telegram.org/bot{self.token}"
-        self.timeout = 10
+    def __init__(self, token: Optional[str] = None, api_url: Optional[str] = None,
+                 global_rate: Optional[float] = None, chat_rate: Optional[float] = None):
+        self.token = token or settings.TG_TOKEN
+        self.base_url = f"{api_url or settings.TG_API_URL}/bot{self.token}"
+        self.timeout = settings.TG_TIMEOUT
+        self.limiter = RateLimiter(global_rate or settings.TG_GLOBAL_RATE, chat_rate or settings.TG_CHAT_RATE)
+        # Один клиент на процесс: соединения с api.telegram.org переиспользуются (keep-alive)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=settings.TG_MAX_CONNECTIONS,
+                                max_keepalive_connections=settings.TG_MAX_CONNECTIONS),
+        )
+        self.sent = 0
+        self.errors = 0
+        self.rate_limited = 0
 
-    def _make_request(self, method: str, params: dict = None) -> Optional[Dict]:
+    async def call(self, method: str, params: dict = None, timeout: Optional[float] = None):
         """
-        Внутренний метод для выполнения запросов к API
+        Вызов метода API
 
         Args:
             method: метод API (sendMessage, getUpdates и т.д.)
             params: параметры запроса
+            timeout: таймаут запроса вместо TG_TIMEOUT
 
         Returns:
-            ответ от API или None в случае ошибки
-        """
-        url = f"{self.base_url}/{method}"
+            поле result из ответа
 
+        Raises:
+            TelegramError: сетевая ошибка или ok=false в ответе
+        """
         try:
-            response = requests.post(
-                url,
-                json=params,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-
+            response = await self.client.post(f"/{method}", json=params,
+                                              timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
             data = response.json()
-            if data.get('ok'):
-                return data.get('result')
-            else:
-                print(f"Ошибка API: {data.get('description')}")
-                return None
-
-        except requests.exceptions.RequestException as e:
-            print(f"Ошибка запроса: {e}")
-            return None
+        except httpx.HTTPError as e:
+            raise TelegramError(f"Ошибка запроса: {e!r}")
+        except ValueError:
+            raise TelegramError(f"Некорректный ответ API: HTTP {response.status_code}")
+
+        if data.get('ok'):
+            return data.get('result')
+
+        code = data.get('error_code', response.status_code)
+        description = data.get('description', f"HTTP {code}")
+        if code == 429:
+            self.rate_limited += 1
+            raise TelegramError(description, retry_after=data.get('parameters', {}).get('retry_after', 1))
+        # 400 (чат не найден) и 403 (бот заблокирован) повторять бессмысленно
+        raise TelegramError(description, permanent=code in (400, 403))
 
-    def get_chat_ids(self, limit: int = 100) -> List[Dict]:
+    async def get_updates(self, offset: Optional[int] = None, timeout: int = 0, limit: int = 100) -> List[Dict]:
         """
-        Получение списка всех chat_id, которые писали боту
+        Получение новых обновлений (long polling)
 
         Args:
+            offset: update_id, с которого читать; все более ранние Telegram считает прочитанными
+            timeout: сколько секунд ждать новых обновлений на стороне Telegram
             limit: максимальное количество обновлений для получения
 
-        Returns:
-            список словарей с информацией о чатах
+        Raises:
+            TelegramError
         """
         params = {
+            'offset': offset,
             'limit': limit,
-            'timeout': 0
+            'timeout': timeout,
+            'allowed_updates': ['message'],
         }
+        # HTTP-таймаут должен быть больше времени ожидания long polling
+        return await self.call('getUpdates', params, timeout=timeout + self.timeout) or []
 
-        updates = self._make_request('getUpdates', params)
-
-
-        if not updates:
-            print("Нет новых сообщений. Напишите что-нибудь боту и попробуйте снова.")
-            return []
-
-        # Собираем уникальные чаты
-        chats = {}
-        for update in updates:
-            if 'message' in update:
-                chat = update['message']['chat']
-                chat_id = chat['id']
-
-                # Сохраняем только уникальные чаты с последней информацией
-                chats[chat_id] = {
-                    'chat_id': chat_id,
-                    'type': chat.get('type'),
-                    'title': chat.get('title'),
-                    'first_name': chat.get('first_name'),
-                    'last_name': chat.get('last_name'),
-                    'username': chat.get('username'),
-                    'last_message': update['message'].get('text'),
-                    'last_message_time': update['message'].get('date')
-                }
-
-        result = list(chats.values())
-
+    async def deliver(self, chat_id: Union[int, str], text: str, disable_notification: bool = False) -> Dict:
+        """Отправка с учетом лимитов; ошибки не глотаются (TelegramError) - для очереди повторов"""
+        await self.limiter.acquire(chat_id)
+        try:
+            result = await self.call('sendMessage', {
+                'chat_id': chat_id,
+                'text': text,
+                'disable_notification': disable_notification
+            })
+        except TelegramError as e:
+            self.errors += 1
+            if e.retry_after:
+                self.limiter.block(chat_id, e.retry_after)
+            raise
+        self.sent += 1
         return result
 
-    def send_message(
+    async def send_message(
             self,
             chat_id: Union[int, str],
             text: str,
@@ -108,17 +220,48 @@ class TelegramBot:
         Returns:
             информация об отправленном сообщении или None
         """
-        params = {
-            'chat_id': chat_id,
-            'text': text,
-            'disable_notification': disable_notification
+        try:
+            result = await self.deliver(chat_id, text, disable_notification)
+        except TelegramError as e:
+            print(f"✗ Ошибка отправки в чат {chat_id}: {e}")
+            return None
+
+        print(f"✓ Сообщение отправлено в чат {chat_id}")
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "limiter_wait_s": round(self.limiter.waited, 3),
         }
 
-        result = self._make_request('sendMessage', params)
+    async def close(self):
+        await self.client.aclose()
 
-        if result:
-            print(f"✓ Сообщение отправлено в чат {chat_id}")
-        else:
-            print(f"✗ Ошибка отправки в чат {chat_id}")
 
-        return result
+def collect_chats(updates: List[Dict]) -> List[Dict]:
+    """Уникальные чаты из обновлений, у каждого - данные из последнего сообщения"""
+    chats = {}
+    for update in updates:
+        if 'message' in update:
+            chat = update['message']['chat']
+            chat_id = chat['id']
+
+            # Сохраняем только уникальные чаты с последней информацией
+            chats[chat_id] = {
+                'chat_id': chat_id,
+                'type': chat.get('type'),
+                'title': chat.get('title'),
+                'first_name': chat.get('first_name'),
+                'last_name': chat.get('last_name'),
+                'username': chat.get('username'),
+                'last_message': update['message'].get('text'),
+                'last_message_time': update['message'].get('date')
+            }
+
+    return list(chats.values())
+
+
+bot = TelegramBot()
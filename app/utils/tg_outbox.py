@@ -0,0 +1,161 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.models import TelegramOutbox
+from app.utils.tg_bot_alert import TelegramBot, TelegramError, bot
+
+
+settings = get_settings()
+
+
+def retry_delay(attempts: int, retry_after: Optional[float] = None) -> float:
+    """Экспоненциальная задержка с разбросом; 429 ждет не меньше retry_after"""
+    delay = min(settings.TG_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.TG_RETRY_MAX_SECONDS)
+    delay *= random.uniform(0.5, 1.0)
+    return max(delay, retry_after or 0)
+
+
+async def enqueue(db: AsyncSession, chat_ids: list[int], message: str):
+    """
+    Поставить сообщение в очередь для каждого чата
+
+    Коммит остается за вызывающим: сообщение попадает в очередь в той же
+    транзакции, что и изменения, о которых оно сообщает.
+    """
+    now = datetime.now()
+    await db.execute(insert(TelegramOutbox), [
+        {"chat_id": chat_id, "message": message, "attempts": 0, "failed": False,
+         "next_attempt_at": now, "created_at": now}
+        for chat_id in chat_ids
+    ])
+
+
+class OutboxWorker:
+    """
+    Фоновая отправка telegram_outbox
+
+    Пачка готовых к отправке строк забирается FOR UPDATE SKIP LOCKED и сразу
+    получает аренду: next_attempt_at сдвигается на TG_OUTBOX_LEASE_SECONDS,
+    attempts увеличивается, транзакция коммитится. Отправка идет уже без
+    открытой транзакции и блокировок, поэтому несколько воркеров uvicorn не
+    отправят одно сообщение дважды, а долгий retry_after не держит строки.
+    Итог пишется второй транзакцией: доставленные строки удаляются,
+    остальные получают следующую попытку с экспоненциальной задержкой,
+    после TG_MAX_ATTEMPTS или постоянной ошибки - failed. Если процесс
+    упадет между отправкой и записью итога, сообщение повторится после
+    окончания аренды.
+    """
+    def __init__(self, bot: TelegramBot, poll_interval: float, batch_size: int, lease: float):
+        self.bot = bot
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def _send(self, row: TelegramOutbox) -> Optional[TelegramError]:
+        try:
+            await self.bot.deliver(row.chat_id, row.message)
+        except TelegramError as e:
+            return e
+        return None
+
+    async def claim(self) -> list[TelegramOutbox]:
+        """Забрать пачку готовых сообщений под аренду (attempts уже учитывает эту попытку)"""
+        async with SessionLocal() as db:
+            now = datetime.now()
+            rows = (await db.scalars(
+                select(TelegramOutbox)
+                .where(TelegramOutbox.failed.is_(False), TelegramOutbox.next_attempt_at <= now)
+                .order_by(TelegramOutbox.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            for row in rows:
+                row.attempts += 1
+                row.next_attempt_at = now + timedelta(seconds=self.lease)
+            await db.commit()
+        return list(rows)
+
+    async def record(self, rows: list[TelegramOutbox], errors: list[Optional[TelegramError]]):
+        delivered = []
+        retries = []
+        now = datetime.now()
+        for row, error in zip(rows, errors):
+            if error is None:
+                delivered.append(row.outbox_id)
+                continue
+            values = {"outbox_id": row.outbox_id, "last_error": str(error)[:255]}
+            if error.permanent or row.attempts >= settings.TG_MAX_ATTEMPTS:
+                values.update(failed=True, next_attempt_at=now)
+                self.failed += 1
+            else:
+                values.update(failed=False,
+                              next_attempt_at=now + timedelta(seconds=retry_delay(row.attempts, error.retry_after)))
+                self.retried += 1
+            retries.append(values)
+
+        async with SessionLocal() as db:
+            if delivered:
+                await db.execute(delete(TelegramOutbox).where(TelegramOutbox.outbox_id.in_(delivered)))
+            if retries:
+                await db.execute(update(TelegramOutbox), retries)
+            await db.commit()
+        self.delivered += len(delivered)
+
+    async def drain_once(self) -> int:
+        rows = await self.claim()
+        if not rows:
+            return 0
+        # Отправки идут параллельно, темп задает RateLimiter бота
+        errors = await asyncio.gather(*(self._send(row) for row in rows))
+        await self.record(rows, errors)
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                # Полная пачка - в очереди, скорее всего, есть еще
+                if await self.drain_once() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"Ошибка отправки очереди Telegram: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def notify(self):
+        """Разбудить воркер сразу после коммита новых сообщений"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"delivered": self.delivered, "retried": self.retried, "failed": self.failed,
+                "bot": self.bot.stats()}
+
+
+worker = OutboxWorker(bot, settings.TG_OUTBOX_POLL_SECONDS, settings.TG_OUTBOX_BATCH, settings.TG_OUTBOX_LEASE_SECONDS)
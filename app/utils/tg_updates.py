@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.models import TelegramPollState, TelegramUser
+from app.utils.tg_bot_alert import TelegramBot, bot, collect_chats
+
+
+settings = get_settings()
+
+STATE_ID = 1
+
+
+async def load_offset() -> Optional[int]:
+    async with SessionLocal() as db:
+        last = await db.scalar(select(TelegramPollState.last_update_id).where(TelegramPollState.id == STATE_ID))
+    return last + 1 if last is not None else None
+
+
+async def save_updates(updates: list) -> int:
+    """
+    Новые чаты и последний update_id - одной транзакцией
+
+    Если процесс упадет до коммита, те же обновления придут повторно, а
+    вставка чатов с ON CONFLICT DO NOTHING сделает повтор безвредным.
+    """
+    chats = collect_chats(updates)
+    last_update_id = max(update["update_id"] for update in updates)
+    async with SessionLocal() as db:
+        if chats:
+            await db.execute(
+                pg_insert(TelegramUser)
+                .values([{"chat_id": chat["chat_id"],
+                          "username": chat["username"] or str(chat["chat_id"]),
+                          "is_active": False} for chat in chats])
+                .on_conflict_do_nothing()
+            )
+        stmt = pg_insert(TelegramPollState).values(id=STATE_ID, last_update_id=last_update_id)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[TelegramPollState.id],
+            set_={"last_update_id": func.greatest(TelegramPollState.last_update_id, stmt.excluded.last_update_id)},
+        ))
+        await db.commit()
+    return last_update_id
+
+
+class UpdatesPoller:
+    """
+    Фоновый long polling getUpdates
+
+    Telegram держит запрос до TG_POLL_TIMEOUT секунд и отвечает сразу, как
+    только боту кто-то напишет. offset хранится в telegram_poll_state, поэтому
+    после перезапуска обрабатываются только новые обновления, а страница
+    /telegram_alert/show читает чаты из БД и не ходит в Telegram.
+    """
+    def __init__(self, bot: TelegramBot, poll_timeout: int, retry_seconds: float):
+        self.bot = bot
+        self.poll_timeout = poll_timeout
+        self.retry_seconds = retry_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.offset: Optional[int] = None
+        self.updates = 0
+        self.errors = 0
+        self.last_poll: Optional[datetime] = None
+
+    async def _run(self):
+        while True:
+            try:
+                if self.offset is None:
+                    self.offset = await load_offset()
+                updates = await self.bot.get_updates(self.offset, self.poll_timeout)
+                self.last_poll = datetime.now()
+                if updates:
+                    self.offset = await save_updates(updates) + 1
+                    self.updates += len(updates)
+            except Exception as e:
+                # 409 - getUpdates уже вызывает другой процесс; сетевые ошибки - тоже просто ждем
+                self.errors += 1
+                print(f"Ошибка получения обновлений Telegram: {e}")
+                await asyncio.sleep(self.retry_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"offset": self.offset, "updates": self.updates, "errors": self.errors,
+                "last_poll": self.last_poll.isoformat() if self.last_poll else None}
+
+
+poller = UpdatesPoller(bot, settings.TG_POLL_TIMEOUT, settings.TG_POLL_RETRY_SECONDS)
@@ -0,0 +1,112 @@
+import hashlib
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+# Запас на заголовки и границы частей multipart сверх самих файлов
+PART_OVERHEAD = 1024
+
+
+@dataclass(frozen=True, slots=True)
+class UploadedFile:
+    filename: str
+    data: bytes
+    sha256: bytes
+
+
+class _PartCollector:
+    """
+    Колбэки MultipartParser: файлы собираются прямо из кусков тела запроса
+
+    В отличие от request.form() части не пишутся в SpooledTemporaryFile:
+    каждый кусок сохраняется как memoryview без копирования, а в конце части
+    склеивается в bytes одной копией. Лимиты проверяются по мере чтения,
+    поэтому лишний файл или слишком большой файл обрывают запрос сразу.
+    """
+    def __init__(self, max_files: int, max_file_bytes: int):
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.files: list[UploadedFile] = []
+        self._header_field = b""
+        self._header_value = b""
+        self._filename = None
+        self._chunks: list = []
+        self._size = 0
+
+    def on_part_begin(self):
+        self._filename = None
+        self._chunks = []
+        self._size = 0
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            _, options = parse_options_header(self._header_value)
+            filename = options.get(b"filename")
+            if filename is not None:
+                if len(self.files) >= self.max_files:
+                    raise HTTPException(413, f"Не больше {self.max_files} файлов за запрос")
+                self._filename = filename.decode("utf-8", "replace")
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._filename is None:
+            return
+        self._size += end - start
+        if self._size > self.max_file_bytes:
+            raise HTTPException(413, f"Файл {self._filename} больше {self.max_file_bytes} байт")
+        # Парсер может отдать свой внутренний буфер (bytearray), его держать нельзя
+        self._chunks.append(memoryview(data)[start:end] if isinstance(data, bytes) else bytes(data[start:end]))
+
+    def on_part_end(self):
+        if self._filename is None:
+            return
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.files.append(UploadedFile(self._filename, data, hashlib.sha256(data).digest()))
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+
+async def read_uploads(request: Request, max_files: int, max_file_bytes: int) -> list[UploadedFile]:
+    """
+    Файлы из multipart/form-data, каждый прочитан один раз
+
+    Получившиеся bytes без копий идут в хэш (он же ключ кэша разбора и адрес
+    в cert_blobs), в разбор и в INSERT. Тело больше max_files * max_file_bytes
+    отклоняется по Content-Length, не читая его.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(400, "Ожидается multipart/form-data")
+
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_files * (max_file_bytes + PART_OVERHEAD):
+        raise HTTPException(413, "Слишком большой запрос")
+
+    collector = _PartCollector(max_files, max_file_bytes)
+    parser = MultipartParser(options[b"boundary"], collector.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        raise HTTPException(400, f"Некорректный multipart: {e}")
+    return collector.files
@@ -0,0 +1,72 @@
+"""
+Байты по сети на один вход пользователя: прежний агент против протокола v2.
+
+Запуск из корня репозитория:
+    python -m bench.agent_payload [путь_к_сертификату] [число_сертификатов]
+
+Прежний агент отправлял multipart со всеми сертификатами и отдельный JSON
+с характеристиками (внутри еще и список сертификатов). Агент v2 делает
+рукопожатие /parcer/v2/known и один gzip-отчет, где DER есть только у
+сертификатов, которых сервер еще не знает: при первом входе - у всех, дальше -
+ни у одного. Считаются только тела запросов; сервер не нужен.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+from bench.spec_diff import SPEC
+
+
+def certificates(cert_path: str, count: int) -> list[bytes]:
+    with open(cert_path, "rb") as f:
+        first = f.read()
+    # Остальные сертификаты - случайные байты той же длины: DER почти не сжимается
+    return [first] + [os.urandom(len(first)) for _ in range(count - 1)]
+
+
+def multipart(files: list[bytes]) -> bytes:
+    boundary = "------------------------curlboundary0123456789"
+    parts = [f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; "
+             f"filename=\"{hashlib.sha1(data).hexdigest().upper()}.cer\"\r\n"
+             f"Content-Type: application/octet-stream\r\n\r\n".encode() + data + b"\r\n" for data in files]
+    return b"".join(parts) + f"--{boundary}--\r\n".encode()
+
+
+def legacy(certs: list[bytes]) -> int:
+    spec = dict(SPEC, certificates=[
+        {"subject": "CN=Иванов Иван, O=ООО Ромашка, C=RU", "thumbprint": hashlib.sha1(data).hexdigest().upper(),
+         "issuer": "CN=Удостоверяющий центр", "notAfter": "18-10-2027", "notBefore": "18-10-2026"}
+        for data in certs
+    ])
+    return len(multipart(certs)) + len(json.dumps(spec, indent=4, ensure_ascii=False).encode("utf-8"))
+
+
+def v2(certs: list[bytes], known: bool) -> int:
+    thumbprints = [hashlib.sha1(data).hexdigest() for data in certs]
+    handshake = json.dumps({"thumbprints": thumbprints}, separators=(",", ":")).encode()
+    report = {
+        "version": 2,
+        "spec": SPEC,
+        "thumbprints": thumbprints,
+        "certs": [] if known else [base64.b64encode(data).decode() for data in certs],
+    }
+    body = gzip.compress(json.dumps(report, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    return len(handshake) + len(body)
+
+
+def main(cert_path: str, count: int):
+    certs = certificates(cert_path, count)
+    old = legacy(certs)
+    print(f"{count} сертификатов по {len(certs[0])} байт")
+    print(f"{'':<32} {'bytes':>8} {'x':>7} {'parsed':>7}")
+    print(f"{'legacy: multipart + JSON':<32} {old:>8} {1:>7.1f} {count:>7}")
+    for name, known in (("v2, первый вход", False), ("v2, повторный вход", True)):
+        size = v2(certs, known)
+        print(f"{name:<32} {size:>8} {old / size:>7.1f} {0 if known else count:>7}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "hlam/cert.cer", int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,82 @@
+"""
+Микробенчмарк AuthMiddleware: запросы с валидной access-cookie.
+
+Запуск из корня репозитория:
+    python -m bench.auth_middleware
+
+Сравнивает прежнюю реализацию на BaseHTTPMiddleware с текущей ASGI-версией,
+а для ASGI-версии - путь без кэша (каждый запрос проверяет подпись JWT) и путь
+с кэшем проверенных токенов. Сеть не участвует - приложение вызывается
+напрямую через ASGI.
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, RedirectResponse
+from jose import JWTError, jwt
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.config import get_settings
+from app.middleware.auth import AuthMiddleware
+from app.middleware.hash_tokens import create_access_token
+from app.middleware.token_cache import token_cache
+
+REQUESTS = 5000
+
+settings = get_settings()
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """Путь валидного access-токена в прежней реализации (до перехода на чистый ASGI)"""
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in ["/auth/login"] or request.url.path.startswith(("/static/", '/parcer/')):
+            return await call_next(request)
+        try:
+            jwt.decode(request.cookies.get(settings.COOKIE_NAME), settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            return await call_next(request)
+        except JWTError:
+            return RedirectResponse(url="/auth/login", status_code=303)
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+
+    @app.get("/ping")
+    async def ping():
+        return PlainTextResponse("pong")
+
+    return app
+
+
+async def run(app: FastAPI, token: str) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies={settings.COOKIE_NAME: token}) as client:
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            await client.get("/ping")
+        return (time.perf_counter() - start) / REQUESTS * 1_000_000
+
+
+async def main():
+    token = create_access_token({"sub": "bench"})
+    cache_size = token_cache.maxsize
+
+    legacy = await run(build_app(LegacyAuthMiddleware), token)
+    app = build_app(AuthMiddleware)
+    token_cache.maxsize = 0
+    uncached = await run(app, token)
+    token_cache.maxsize = cache_size
+    cached = await run(app, token)
+
+    print(f"{'path':<22} {'us/request':>10}")
+    print(f"{'BaseHTTPMiddleware':<22} {legacy:>10.1f}")
+    print(f"{'ASGI, uncached':<22} {uncached:>10.1f}")
+    print(f"{'ASGI, cached':<22} {cached:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
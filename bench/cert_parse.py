@@ -0,0 +1,57 @@
+"""
+Сравнение разбора сертификатов: inline (в event loop) против пула потоков/процессов.
+
+Запуск из корня репозитория:
+    python -m bench.cert_parse [путь_к_сертификату]
+
+Для каждого уровня параллельности (1, 8, 64 одновременных загрузок) выводится
+пропускная способность и максимальная задержка event loop - именно она
+показывает, насколько разбор мешает остальным запросам воркера.
+"""
+import asyncio
+import sys
+import time
+
+from app.utils.cert_info import CertParsePool
+
+CONCURRENCY = (1, 8, 64)
+ROUNDS = 20
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.001) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(pool: CertParsePool, cert_data: bytes, concurrency: int):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await asyncio.gather(*(pool.parse(cert_data) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await lag_task
+    return concurrency * ROUNDS / elapsed, lag * 1000
+
+
+async def main(path: str):
+    with open(path, "rb") as f:
+        cert_data = f.read()
+
+    print(f"{'mode':<8} {'uploads':>7} {'certs/s':>10} {'max loop lag, ms':>17}")
+    for mode in ("inline", "thread", "process"):
+        for concurrency in CONCURRENCY:
+            pool = CertParsePool(mode=mode, workers=4, queue_size=64, queue_timeout=30)
+            await pool.parse(cert_data)  # прогрев пула
+            rate, lag = await run(pool, cert_data, concurrency)
+            pool.shutdown()
+            print(f"{mode:<8} {concurrency:>7} {rate:>10.0f} {lag:>17.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "hlam/cert.cer"))
@@ -0,0 +1,101 @@
+"""
+Локальная замена api.telegram.org для проверок и бенчмарков.
+
+Запуск:
+    python -m bench.fake_telegram [порт] [задержка_мс]
+
+и в .env приложения: TG_API_URL=http://127.0.0.1:8081
+
+Отвечает на sendMessage и getUpdates как Bot API, сам соблюдает лимиты
+Telegram (1 сообщение в секунду на чат, 30 в секунду всего) и при их
+превышении возвращает 429 с retry_after - так видно, держит ли клиент темп.
+Чаты с отрицательным id отвечают 403 (бот заблокирован).
+Статистика: GET /stats.
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def make_app(latency: float = 0.0, global_rate: int = 30, chat_interval: float = 1.0) -> FastAPI:
+    app = FastAPI()
+    state = {"received": 0, "accepted": 0, "rate_limited": 0, "forbidden": 0, "updates": []}
+    last_by_chat: dict[int, float] = {}
+    recent: deque = deque()
+    new_update = asyncio.Event()
+
+    def error(code: int, description: str, **parameters):
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return JSONResponse(body, status_code=code)
+
+    @app.post("/bot{token}/sendMessage")
+    async def send_message(token: str, request: Request):
+        params = await request.json()
+        chat_id = int(params["chat_id"])
+        state["received"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if chat_id < 0:
+            state["forbidden"] += 1
+            return error(403, "Forbidden: bot was blocked by the user")
+
+        now = time.monotonic()
+        while recent and now - recent[0] > 1:
+            recent.popleft()
+        since_last = now - last_by_chat.get(chat_id, -chat_interval)
+        # 10% допуска на неравномерность сети, как и у настоящего API
+        if len(recent) >= global_rate * 1.1 or since_last < chat_interval * 0.9:
+            state["rate_limited"] += 1
+            return error(429, "Too Many Requests: retry after 1", retry_after=1)
+
+        recent.append(now)
+        last_by_chat[chat_id] = now
+        state["accepted"] += 1
+        return {"ok": True, "result": {"message_id": state["accepted"], "chat": {"id": chat_id},
+                                       "date": int(time.time()), "text": params.get("text")}}
+
+    @app.post("/bot{token}/getUpdates")
+    async def get_updates(token: str, request: Request):
+        params = await request.json()
+        offset = params.get("offset") or 0
+        updates = [update for update in state["updates"] if update["update_id"] >= offset]
+        if not updates and params.get("timeout"):
+            # Long polling: держим запрос, пока не придет сообщение или не выйдет timeout
+            new_update.clear()
+            try:
+                await asyncio.wait_for(new_update.wait(), params["timeout"])
+            except asyncio.TimeoutError:
+                pass
+            updates = [update for update in state["updates"] if update["update_id"] >= offset]
+        return {"ok": True, "result": updates[:params.get("limit", 100)]}
+
+    @app.post("/updates")
+    async def add_update(request: Request):
+        """Имитировать сообщение боту: {"chat_id": ..., "username": ..., "text": ...}"""
+        data = await request.json()
+        update_id = len(state["updates"]) + 1
+        state["updates"].append({"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "text": data.get("text", "/start"),
+            "chat": {"id": data["chat_id"], "type": "private", "username": data.get("username")},
+        }})
+        new_update.set()
+        return {"update_id": update_id}
+
+    @app.get("/stats")
+    async def stats():
+        return {key: value for key, value in state.items() if key != "updates"}
+
+    return app
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    uvicorn.run(make_app(latency), host="127.0.0.1", port=port, log_level="warning")
@@ -0,0 +1,61 @@
+"""
+Нагрузочный тест загрузок от агентов: /parcer/pc и /parcer/cert одновременно.
+
+Запуск против работающего сервера:
+    python -m bench.load_ingest http://127.0.0.1:8000 [путь_к_сертификату]
+
+Каждый "агент" - отдельный domain_name, отправляет характеристики и сертификат,
+как это делает hlam/script.ps1 при входе пользователя. Для каждого уровня
+параллельности выводятся requests/sec и перцентили задержки.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+CONCURRENCY = (1, 8, 32, 128)
+REQUESTS_PER_AGENT = 10
+
+SPEC = {
+    "motherboard": {"manufacturer": "ASUS", "product": "PRIME B450", "serial": "MB-1"},
+    "cpu": {"name": "AMD Ryzen 5 3600", "cores": 6, "threads": 12, "maxClock": 3.6},
+    "ram": {"totalGB": 16, "slots": 2, "modules": [{"manufacturer": "Kingston", "capacityGB": 8, "speed": 3200}] * 2},
+    "storage": [{"model": "Samsung SSD 970", "sizeGB": 476.94, "interface": "SCSI", "serial": "S1"}],
+    "gpu": {"name": "NVIDIA GeForce GTX 1650", "ramMB": 4096, "driver": "31.0.15"},
+}
+
+
+async def agent(client: httpx.AsyncClient, n: int, cert_data: bytes, latencies: list):
+    domain_name = f"BENCH-PC-{n:05d}"
+    for _ in range(REQUESTS_PER_AGENT):
+        start = time.perf_counter()
+        await client.post(f"/parcer/pc/{domain_name}/bench", json=SPEC)
+        latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await client.post(f"/parcer/cert/{domain_name}/bench", files=[("files", ("bench.cer", cert_data))])
+        latencies.append(time.perf_counter() - start)
+
+
+async def main(base_url: str, cert_path: str):
+    with open(cert_path, "rb") as f:
+        cert_data = f.read()
+
+    print(f"{'agents':>6} {'req/s':>8} {'p50, ms':>8} {'p95, ms':>8}")
+    limits = httpx.Limits(max_connections=max(CONCURRENCY))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60, verify=False) as client:
+        for concurrency in CONCURRENCY:
+            latencies = []
+            start = time.perf_counter()
+            await asyncio.gather(*(agent(client, n, cert_data, latencies) for n in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+            print(f"{concurrency:>6} {len(latencies) / elapsed:>8.1f} {p50:>8.1f} {p95:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "hlam/cert.cer"))
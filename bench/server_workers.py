@@ -0,0 +1,94 @@
+"""
+Пропускная способность сервера в зависимости от числа воркеров.
+
+Запуск из корня репозитория (нужна БД из DATABASE_URL, как для обычного сервера):
+    python -m bench.server_workers [путь_к_сертификату] [число_воркеров ...]
+
+Для каждого числа воркеров (по умолчанию 1, 2, 4 и все доступные ядра)
+поднимается python run.py --workers N на отдельном порту, после чего
+AGENTS агентов из bench.load_ingest одновременно шлют характеристики и
+сертификаты. Выводятся requests/sec, перцентили задержки и ускорение
+относительно первой строки. Сервер останавливается SIGTERM, как при
+обычном развертывании, - заодно проверяется мягкая остановка воркеров.
+
+Что ожидать: /parcer упирается в разбор сертификатов и сериализацию JSON,
+то есть в CPU, поэтому req/s растет почти линейно, пока воркеров не больше
+ядер; дальше растут только задержки. Каждый воркер держит свой пул
+соединений (DB_POOL_SIZE + DB_MAX_OVERFLOW) - проверьте max_connections
+Postgres перед тем, как поднимать SERVER_WORKERS.
+"""
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench.load_ingest import agent
+from run import default_workers
+
+AGENTS = 64
+PORT = 8765
+START_TIMEOUT = 60
+
+
+def wait_port(port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Сервер не открыл порт {port} за {timeout} с")
+
+
+async def load(port: int, cert_data: bytes) -> tuple[float, float, float]:
+    latencies = []
+    limits = httpx.Limits(max_connections=AGENTS)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        # Прогрев: кэш разбора сертификата и соединения с БД в каждом воркере
+        await asyncio.gather(*(agent(client, n, cert_data, []) for n in range(AGENTS)))
+        start = time.perf_counter()
+        await asyncio.gather(*(agent(client, n, cert_data, latencies) for n in range(AGENTS)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (len(latencies) / elapsed, statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.95) - 1] * 1000)
+
+
+def run(workers: int, cert_data: bytes) -> tuple[float, float, float]:
+    server = subprocess.Popen(
+        [sys.executable, "run.py", "--workers", str(workers), "--port", str(PORT),
+         "--host", "127.0.0.1", "--ssl-keyfile", "", "--ssl-certfile", ""],
+        env={**os.environ, "SERVER_MAX_REQUESTS": "0"},
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_port(PORT, START_TIMEOUT)
+        return asyncio.run(load(PORT, cert_data))
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main(cert_path: str, counts: list[int]):
+    with open(cert_path, "rb") as f:
+        cert_data = f.read()
+
+    print(f"{AGENTS} агентов, ядер доступно: {default_workers()}")
+    print(f"{'workers':>7} {'req/s':>8} {'p50, ms':>8} {'p95, ms':>8} {'speedup':>8}")
+    baseline = None
+    for workers in counts:
+        rps, p50, p95 = run(workers, cert_data)
+        baseline = baseline or rps
+        print(f"{workers:>7} {rps:>8.1f} {p50:>8.1f} {p95:>8.1f} {rps / baseline:>8.2f}")
+
+
+if __name__ == "__main__":
+    cert = sys.argv[1] if len(sys.argv) > 1 else "hlam/cert.cer"
+    counts = [int(n) for n in sys.argv[2:]] or sorted({1, 2, 4, default_workers()})
+    main(cert, counts)
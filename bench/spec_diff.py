@@ -0,0 +1,84 @@
+"""
+Микробенчмарк сравнения характеристик ПК: spec_check.compare.
+
+Запуск из корня репозитория:
+    python -m bench.spec_diff
+
+Сравнивает прежнюю реализацию (пять ключей, компонент целиком в old/new)
+с путевым diff на реалистичном отчете агента: 4 модуля памяти, 3 диска,
+2 видеокарты. Сценарии - отчет без изменений, изменилась частота одного
+модуля, добавлен диск. Для каждого выводится время сравнения и размер
+истории в JSON, который попал бы в pc_spec_changes.
+"""
+import copy
+import json
+import time
+
+from app.utils import spec_check
+
+ROUNDS = 20000
+
+SPEC = {
+    "computer": "BENCH-PC", "user": "bench", "timestamp": "2026-10-18 09:00:00",
+    "motherboard": {"manufacturer": "ASUSTeK COMPUTER INC.", "product": "PRIME B450M-A", "serial": "MB-190912345"},
+    "cpu": {"name": "AMD Ryzen 5 3600 6-Core Processor", "cores": 6, "threads": 12, "maxClock": 3.6},
+    "ram": {"totalGB": 32, "slots": 4, "modules": [
+        {"manufacturer": "Kingston", "capacityGB": 8, "speed": 3200} for _ in range(4)
+    ]},
+    "storage": [
+        {"model": "Samsung SSD 970 EVO Plus 500GB", "sizeGB": 465.76, "interface": "SCSI", "serial": "S4EVNX0N1"},
+        {"model": "WDC WD10EZEX-08WN4A0", "sizeGB": 931.51, "interface": "IDE", "serial": "WD-WCC6Y2"},
+        {"model": "ST2000DM008-2FR102", "sizeGB": 1863.01, "interface": "IDE", "serial": "ZFL1K3"},
+    ],
+    "gpu": [
+        {"name": "NVIDIA GeForce GTX 1650", "ramMB": 4096, "driver": "31.0.15.3623"},
+        {"name": "AMD Radeon(TM) Graphics", "ramMB": 512, "driver": "30.0.13002"},
+    ],
+}
+
+
+def legacy_compare(old_pc, new_pc):
+    # Прежний spec_check.compare
+    history = []
+    for component in ("motherboard", "cpu", "gpu", "ram", "storage"):
+        if new_pc[component] != old_pc[component]:
+            history.append({"date": "18-10-2026 09:00:00", "old": old_pc[component], "new": new_pc[component]})
+    return history
+
+
+def scenarios():
+    same = copy.deepcopy(SPEC)
+    same["timestamp"] = "2026-10-18 10:00:00"
+
+    ram = copy.deepcopy(same)
+    ram["ram"]["modules"][1]["speed"] = 2666
+
+    disk = copy.deepcopy(same)
+    disk["storage"].insert(0, {"model": "KINGSTON SA400S37240G", "sizeGB": 223.57, "interface": "SCSI", "serial": "50026B77"})
+    return {"unchanged": same, "ram module speed": ram, "disk added": disk}
+
+
+def measure(compare, old, new) -> tuple[float, int]:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        history = compare(old, new)
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1e6
+    return elapsed, len(json.dumps(history, ensure_ascii=False).encode("utf-8"))
+
+
+def main():
+    print(f"{'scenario':<18} {'legacy, us':>11} {'legacy, B':>10} {'diff, us':>9} {'diff, B':>8}  paths")
+    for name, new in scenarios().items():
+        legacy_us, legacy_bytes = measure(legacy_compare, SPEC, new)
+        diff_us, diff_bytes = measure(spec_check.compare, SPEC, new)
+        paths = ", ".join(change["path"] for change in spec_check.compare(SPEC, new)) or "-"
+        print(f"{name:<18} {legacy_us:>11.1f} {legacy_bytes:>10} {diff_us:>9.1f} {diff_bytes:>8}  {paths}")
+    # С хэшем (user-018) неизмененный отчет до compare вообще не доходит
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        spec_check.spec_hash(SPEC)
+    print(f"spec_hash: {(time.perf_counter() - start) / ROUNDS * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Пропускная способность отправки в Telegram против bench.fake_telegram.
+
+Запуск из корня репозитория:
+    python -m bench.telegram_send
+
+Поднимает два фейковых сервера с задержкой ответа 50 мс: без лимитов (сырая
+пропускная способность) и с лимитами Telegram. Сравнивает прежнюю отправку
+(новое соединение на каждое сообщение, по одному) с TelegramBot на общем
+пуле соединений, и проверяет, что ограничитель темпа не получает 429.
+"""
+import asyncio
+import time
+
+import httpx
+import uvicorn
+
+from bench.fake_telegram import make_app
+from app.utils.tg_bot_alert import TelegramBot
+
+LATENCY = 0.05
+MESSAGES = 200
+CHATS = 50
+RAW_PORT, LIMITED_PORT = 8091, 8092
+
+
+def legacy_send(url: str, chat_id: int, text: str):
+    # Как было: блокирующий запрос, соединение на каждое сообщение
+    return httpx.post(f"{url}/botbench/sendMessage", json={"chat_id": chat_id, "text": text}, timeout=10).json()
+
+
+async def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def run(name: str, send, count: int, stats_url: str):
+    start = time.perf_counter()
+    await send(count)
+    elapsed = time.perf_counter() - start
+    async with httpx.AsyncClient() as client:
+        stats = (await client.get(f"{stats_url}/stats")).json()
+    print(f"{name:<34} {count:>5} {elapsed:>8.2f} {count / elapsed:>8.1f} {stats['rate_limited']:>6}")
+
+
+async def main():
+    raw_url, limited_url = f"http://127.0.0.1:{RAW_PORT}", f"http://127.0.0.1:{LIMITED_PORT}"
+    servers = [await serve(make_app(LATENCY, global_rate=10 ** 6, chat_interval=0), RAW_PORT),
+               await serve(make_app(LATENCY), LIMITED_PORT)]
+
+    unlimited = TelegramBot(token="bench", api_url=raw_url, global_rate=10 ** 6, chat_rate=10 ** 6)
+    limited = TelegramBot(token="bench", api_url=limited_url)
+
+    async def legacy(count):
+        for n in range(count):
+            await asyncio.to_thread(legacy_send, raw_url, n % CHATS + 1, "bench")
+
+    def pooled(bot):
+        async def send(count):
+            await asyncio.gather(*(bot.deliver(n % CHATS + 1, "bench") for n in range(count)))
+        return send
+
+    print(f"{'':<34} {'msgs':>5} {'sec':>8} {'msg/s':>8} {'429':>6}")
+    await run("legacy: conn per message, serial", legacy, MESSAGES, raw_url)
+    await run("pooled client, no limits", pooled(unlimited), MESSAGES, raw_url)
+    # 60 сообщений при лимите 30/с и 1/с на чат - около 2 секунд и ни одного 429
+    await run("pooled client, Telegram limits", pooled(limited), 60, limited_url)
+
+    await unlimited.close()
+    await limited.close()
+    for server in servers:
+        server.should_exit = True
+    await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Чтение multipart с сертификатами: request.form() + UploadFile.read() против uploads.read_uploads.
+
+Запуск из корня репозитория:
+    python -m bench.upload_copies [путь_к_сертификату]
+
+Тело запроса с FILES сертификатами подается кусками по 64 КБ, как его отдает
+uvicorn. Для каждого способа выводится время на запрос и пик выделенной
+памяти (tracemalloc) на сертификат, отнесенный к размеру сертификата, -
+это и есть число копий файла, которые живут одновременно. Сеть и БД не
+участвуют.
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from starlette.requests import Request
+
+from app.utils.uploads import read_uploads
+
+FILES = 20
+ROUNDS = 200
+CHUNK = 64 * 1024
+BOUNDARY = "benchboundary7MA4YWxkTrZu0gW"
+
+
+def make_body(cert_data: bytes) -> bytes:
+    parts = []
+    for n in range(FILES):
+        parts.append(
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="cert{n}.cer"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + cert_data + b"\r\n"
+        )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body: bytes) -> Request:
+    chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)]
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    return Request({
+        "type": "http", "method": "POST", "path": "/", "query_string": b"",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+                    (b"content-length", str(len(body)).encode())],
+    }, receive)
+
+
+async def legacy(body: bytes) -> list[bytes]:
+    # Как было: Starlette пишет части в SpooledTemporaryFile, затем read()
+    form = await make_request(body).form()
+    return [await file.read() for file in form.getlist("files")]
+
+
+async def single_read(body: bytes) -> list[bytes]:
+    return [upload.data for upload in await read_uploads(make_request(body), FILES, 64 * 1024)]
+
+
+async def measure(name: str, read, body: bytes, cert_size: int):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await read(body)
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+
+    tracemalloc.start()
+    files = await read(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(files) == FILES
+    print(f"{name:<28} {elapsed:>10.3f} {peak / FILES:>14.0f} {peak / FILES / cert_size:>10.2f}")
+
+
+async def main(cert_path: str):
+    with open(cert_path, "rb") as f:
+        cert_data = f.read()
+    body = make_body(cert_data)
+    print(f"{FILES} файлов по {len(cert_data)} байт, тело {len(body)} байт")
+    print(f"{'':<28} {'ms/request':>10} {'peak B/cert':>14} {'x cert':>10}")
+    await measure("form() + UploadFile.read()", legacy, body, len(cert_data))
+    await measure("read_uploads", single_read, body, len(cert_data))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "hlam/cert.cer"))
@@ -59,64 +59,53 @@ function Get-SystemInfo {
         }
     }
     
-    # Сертификаты (личное хранилище текущего пользователя)
-    $certs = Get-ChildItem -Path Cert:\CurrentUser\My -ErrorAction SilentlyContinue
-    $computerInfo.certificates = $certs | ForEach-Object {
-        @{
-            subject = $_.Subject
-            thumbprint = $_.Thumbprint
-            issuer = $_.Issuer
-            notAfter = $_.NotAfter.ToString('dd-MM-yyyy')
-            notBefore = $_.NotBefore.ToString('dd-MM-yyyy')
-        }
-    }
-    
     return $computerInfo
 }
 
 
 
-# Создаем временную папку
-$tempDir = "$env:TEMP\certs_export_$([System.Guid]::NewGuid())"
-New-Item -ItemType Directory -Path $tempDir -Force | Out-Null
-
-# Получаем все сертификаты из личного хранилища текущего пользователя
-$certs = Get-ChildItem -Path Cert:\CurrentUser\My
-
-$files = @()
-foreach ($cert in $certs) {
-    $thumbprint = $cert.Thumbprint
-    $filePath = Join-Path $tempDir "$thumbprint.cer"
-    Export-Certificate -Cert $cert -FilePath $filePath -Type CERT | Out-Null
-    $files += "-F `"files=@$filePath`""
-}
-
-# Отправляем архив на сервер
-$uri = "http://10.16.16.33:8000/parcer/cert/$env:COMPUTERNAME/$env:USERNAME"
-
-$filesString = $files -join " "
-Invoke-Expression "curl.exe -s $filesString $uri"
-
-Remove-Item $tempDir -Recurse -Force
-Write-Host "✅ Отправлено $($certs.Count) сертификатов"
+$server = "http://10.16.16.33:8000"
 
+# Сертификаты личного хранилища текущего пользователя
+$certs = @(Get-ChildItem -Path Cert:\CurrentUser\My -ErrorAction SilentlyContinue)
+$thumbprints = @($certs | ForEach-Object { $_.Thumbprint.ToLower() })
 
+try {
+    # 1. Рукопожатие: сервер отвечает, файлы каких сертификатов ему нужны
+    $missing = @()
+    if ($thumbprints.Count -gt 0) {
+        $known = Invoke-RestMethod -Uri "$server/parcer/v2/known" `
+            -Method Post `
+            -Body (@{ thumbprints = $thumbprints } | ConvertTo-Json -Compress) `
+            -ContentType "application/json; charset=utf-8" `
+            -TimeoutSec 15
+        $missing = @($known.missing)
+    }
 
-# Собираем информацию
-$data = Get-SystemInfo
+    # 2. Один отчет: характеристики, все отпечатки и DER только недостающих сертификатов
+    $report = @{
+        version = 2
+        spec = Get-SystemInfo
+        thumbprints = $thumbprints
+        certs = @($certs | Where-Object { $missing -contains $_.Thumbprint.ToLower() } |
+                  ForEach-Object { [Convert]::ToBase64String($_.RawData) })
+    }
+    $json = [System.Text.Encoding]::UTF8.GetBytes(($report | ConvertTo-Json -Depth 10 -Compress))
 
-# Конвертируем в JSON с правильной кодировкой
-$jsonBody = $data | ConvertTo-Json -Depth 10
+    # Сжимаем gzip
+    $buffer = New-Object System.IO.MemoryStream
+    $gzip = New-Object System.IO.Compression.GZipStream($buffer, [System.IO.Compression.CompressionMode]::Compress)
+    $gzip.Write($json, 0, $json.Length)
+    $gzip.Close()
 
-# Отправляем на сервер
-try {
-    $response = Invoke-RestMethod -Uri "http://10.16.16.33:8000/parcer/pc" `
+    $response = Invoke-RestMethod -Uri "$server/parcer/v2/report/$env:COMPUTERNAME/$env:USERNAME" `
         -Method Post `
-        -Body $jsonBody `
+        -Body $buffer.ToArray() `
         -ContentType "application/json; charset=utf-8" `
+        -Headers @{ "Content-Encoding" = "gzip" } `
         -TimeoutSec 15
-    
-    Write-Host "✅ Характеристики отправлены успешно"
+
+    Write-Host "✅ Отчет отправлен: характеристики $($response.spec), новых сертификатов $($response.created) из $($certs.Count)"
 } catch {
     Write-Host "❌ Ошибка отправки: $($_.Exception.Message)"
 }
@@ -1,13 +1,129 @@
+"""
+Запуск сервера
+
+    python run.py                - production: несколько воркеров, параметры SERVER_* из .env
+    python run.py --workers 4    - то же, аргументы командной строки важнее .env
+    python run.py --reload       - разработка: один процесс, перезапуск при изменении кода
+
+На Linux воркерами управляет gunicorn: приложение загружается до fork
+(--preload), воркер перезапускается после --max-requests запросов с
+разбросом --max-requests-jitter и дорабатывает текущие запросы
+--graceful-timeout секунд. На Windows gunicorn не работает, там - uvicorn
+--workers без preload. TLS включен по умолчанию: private.key и
+cert_manager_VGLTU.crt из текущего каталога, другие пути - --ssl-keyfile /
+--ssl-certfile (SSL_KEYFILE / SSL_CERTFILE в .env). Без TLS сервер
+запускается только явно: --ssl-keyfile "" --ssl-certfile "".
+"""
+import argparse
+import os
+import sys
+
 import uvicorn
-from app.main import app
+
+from app.config import get_settings
+
+try:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn_worker import UvicornWorker
+except ImportError:  # Windows или gunicorn не установлен
+    BaseApplication = None
+
+APP = "app.main:app"
+
+
+def default_workers() -> int:
+    # В контейнере с ограничением cpuset доступно меньше ядер, чем os.cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parse_args() -> argparse.Namespace:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Сервер cert_manager")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS or default_workers())
+    parser.add_argument("--loop", choices=["auto", "uvloop", "asyncio"], default=settings.SERVER_LOOP)
+    parser.add_argument("--http", choices=["auto", "httptools", "h11"], default=settings.SERVER_HTTP)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=settings.SERVER_PRELOAD)
+    parser.add_argument("--max-requests", type=int, default=settings.SERVER_MAX_REQUESTS)
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.SERVER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVER_GRACEFUL_TIMEOUT)
+    parser.add_argument("--keepalive", type=int, default=settings.SERVER_KEEPALIVE)
+    parser.add_argument("--ssl-keyfile", default=settings.SSL_KEYFILE)
+    parser.add_argument("--ssl-certfile", default=settings.SSL_CERTFILE)
+    parser.add_argument("--reload", action="store_true", help="режим разработки")
+    return parser.parse_args()
+
+
+if BaseApplication is not None:
+    class Server(BaseApplication):
+        """gunicorn без конфигурационного файла: настройки берутся из run.py"""
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # С preload вызывается в мастере до fork: соединения с БД и Telegram
+            # открываются лениво, в lifespan каждого воркера
+            from app.main import app
+            return app
+
+
+def worker_class(loop: str, http: str) -> type:
+    class Worker(UvicornWorker):
+        CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "loop": loop, "http": http}
+    return Worker
+
+
+def main():
+    args = parse_args()
+    # Пустая строка в аргументах отключает TLS, заданный по умолчанию или в .env
+    ssl = {"ssl_keyfile": args.ssl_keyfile or None, "ssl_certfile": args.ssl_certfile or None}
+    if bool(ssl["ssl_keyfile"]) != bool(ssl["ssl_certfile"]):
+        sys.exit("TLS: нужны оба файла, --ssl-keyfile и --ssl-certfile")
+    for path in ssl.values():
+        if path and not os.path.isfile(path):
+            sys.exit(f"TLS: нет файла {path}; без TLS запуск только явно: --ssl-keyfile \"\" --ssl-certfile \"\"")
+
+    if args.reload:
+        uvicorn.run(APP, host=args.host, port=args.port, reload=True, loop=args.loop, http=args.http, **ssl)
+        return
+
+    if BaseApplication is None:
+        uvicorn.run(
+            APP,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop=args.loop,
+            http=args.http,
+            limit_max_requests=args.max_requests or None,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            timeout_keep_alive=args.keepalive,
+            **ssl,
+        )
+        return
+
+    Server({
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": worker_class(args.loop, args.http),
+        "preload_app": args.preload,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "graceful_timeout": args.graceful_timeout,
+        "keepalive": args.keepalive,
+        "keyfile": ssl["ssl_keyfile"],
+        "certfile": ssl["ssl_certfile"],
+        "accesslog": "-",
+    }).run()
+
 
 if __name__ == "__main__":
-    #uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        ssl_keyfile="private.key",      # путь к твоему ключу
-        ssl_certfile="cert_manager_VGLTU.crt"  # путь к сертификату
-    )
\ No newline at end of file
+    main()